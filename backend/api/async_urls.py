@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import async_views
+
+urlpatterns = [
+    path('tags/', async_views.tag_list),
+    path('tags/<int:pk>/', async_views.tag_detail),
+    path('ingredients/', async_views.ingredient_list),
+    path('recipes/', async_views.recipe_list),
+    path('recipes/download_shopping_cart/',
+         async_views.download_shopping_cart),
+    path('recipes/<int:pk>/', async_views.recipe_detail),
+]
@@ -0,0 +1,290 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.urls import resolve
+from django.utils.cache import patch_vary_headers
+from django_filters.utils import translate_validation
+from recipes.autocomplete import ingredient_index
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.versioning import get_version
+from rest_framework import exceptions
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import shopping_cart
+from .caching import (cache_key, cached_response, make_entry,
+                      modified_since, not_modified, recipe_representations,
+                      version_etag)
+from .filters import RecipeFilter
+from .negotiation import FallbackContentNegotiation
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .serializers import IngredientSerializer, TagSerializer
+
+
+class UseSyncView(Exception):
+    """Вариант запроса, который обслуживает синхронная вьюха."""
+
+
+async def authenticate(request):
+    """Пользователь по тем же классам аутентификации, что и у DRF."""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = await sync_to_async(
+            authentication_class().authenticate)(request)
+        if result is not None:
+            return result[0]
+    return AnonymousUser()
+
+
+def read_view(renderer_classes=None, authentication=True,
+              negotiation_class=DefaultContentNegotiation):
+    """Async-вьюха с выбором формата и ответами об ошибках как у DRF.
+
+    Browsable API и варианты запроса, для которых вьюха бросает
+    UseSyncView, обслуживает синхронная вьюха того же адреса из
+    ROOT_URLCONF.
+    """
+    renderers = [renderer_class() for renderer_class in
+                 renderer_classes or api_settings.DEFAULT_RENDERER_CLASSES]
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                response = await _respond(
+                    view, request, renderers, negotiation_class(),
+                    authentication, args, kwargs)
+            except UseSyncView:
+                return await sync_view(request)
+            patch_vary_headers(response, ('Accept',))
+            return response
+        return wrapper
+    return decorator
+
+
+async def sync_view(request):
+    request.resolver_match = resolve(
+        request.path_info, urlconf=settings.ROOT_URLCONF)
+    view, args, kwargs = request.resolver_match
+    return await sync_to_async(view)(request, *args, **kwargs)
+
+
+async def _respond(view, request, renderers, negotiation, authentication,
+                   args, kwargs):
+    try:
+        request.accepted_renderer, _ = negotiation.select_renderer(
+            Request(request), renderers)
+    except (exceptions.NotAcceptable, Http404):
+        raise UseSyncView
+    if request.accepted_renderer.format == 'api':
+        raise UseSyncView
+    try:
+        if authentication:
+            request.user = await authenticate(request)
+        return await view(request, *args, **kwargs)
+    except exceptions.APIException as error:
+        return error_response(request, error)
+
+
+def content_type(renderer):
+    if renderer.charset:
+        return f'{renderer.media_type}; charset={renderer.charset}'
+    return renderer.media_type
+
+
+def render(request, data, status=200):
+    renderer = request.accepted_renderer
+    return HttpResponse(renderer.render(data),
+                        content_type=content_type(renderer), status=status)
+
+
+def error_response(request, error):
+    if isinstance(error.detail, (list, dict)):
+        data = error.detail
+    else:
+        data = {'detail': error.detail}
+    response = render(request, data, status=error.status_code)
+    if isinstance(error, (exceptions.NotAuthenticated,
+                          exceptions.AuthenticationFailed)):
+        authentication_class = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]
+        response['WWW-Authenticate'] = (
+            authentication_class().authenticate_header(request))
+    return response
+
+
+def _versioned_entry(model):
+    version = get_version(model)
+    return version, cache.get(cache_key(model, version))
+
+
+async def cached_list(request, queryset, serializer_class):
+    """Полный список объектов, запись в кэше общая с VersionedCacheMixin."""
+    if request.GET:
+        raise UseSyncView
+    model = queryset.model
+    version, entry = await sync_to_async(_versioned_entry)(model)
+    etag = version_etag(model, version)
+    if etag in request.headers.get('If-None-Match', ''):
+        return not_modified(etag, entry)
+    if entry is None:
+        objects = [obj async for obj in queryset]
+        entry = make_entry(
+            JSONRenderer().render(serializer_class(objects, many=True).data),
+            JSONRenderer.media_type)
+        await cache.aset(cache_key(model, version), entry, timeout=None)
+    if not modified_since(request, entry):
+        return not_modified(etag, entry)
+    return cached_response(request, etag, entry)
+
+
+async def get_object(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise exceptions.NotFound
+
+
+async def paginate(request, queryset):
+    """Страница объектов и ссылки как у PageNumberPagination."""
+    paginator = PageNumberPagination
+    page_size = api_settings.PAGE_SIZE
+    count = await queryset.acount()
+    last = max(1, -(-count // page_size))
+    number = request.GET.get(paginator.page_query_param, 1)
+    if number in paginator.last_page_strings:
+        number = last
+    try:
+        number = int(number)
+    except ValueError:
+        number = 0
+    if not 1 <= number <= last:
+        raise exceptions.NotFound(paginator.invalid_page_message)
+    offset = (number - 1) * page_size
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    previous = None
+    if number == 2:
+        previous = remove_query_param(url, paginator.page_query_param)
+    elif number > 2:
+        previous = replace_query_param(
+            url, paginator.page_query_param, number - 1)
+    return objects, {
+        'count': count,
+        'next': replace_query_param(
+            url, paginator.page_query_param, number + 1)
+        if number < last else None,
+        'previous': previous,
+    }
+
+
+def _filter(filterset):
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+@read_view(authentication=False)
+async def tag_list(request):
+    return await cached_list(request, Tag.objects.all(), TagSerializer)
+
+
+@read_view(authentication=False)
+async def tag_detail(request, pk):
+    tag = await get_object(Tag.objects.all(), pk=pk)
+    return render(request, TagSerializer(tag).data)
+
+
+@read_view(authentication=False)
+async def ingredient_list(request):
+    name = request.GET.get('name')
+    if name is None:
+        return await cached_list(
+            request, Ingredient.objects.all(), IngredientSerializer)
+    entries = await sync_to_async(ingredient_index.search)(name)
+    return render(request, IngredientSerializer(entries, many=True).data)
+
+
+@read_view()
+async def recipe_list(request):
+    if request.GET.get('pagination') == 'cursor':
+        raise UseSyncView
+    queryset = await sync_to_async(_filter)(RecipeFilter(
+        request.GET, queryset=Recipe.objects.only('id', 'author_id'),
+        request=request))
+    recipes, page = await paginate(request, queryset)
+    page['results'] = await sync_to_async(recipe_representations)(
+        request, [(recipe.id, recipe.author_id) for recipe in recipes])
+    return render(request, page)
+
+
+@read_view()
+async def recipe_detail(request, pk):
+    recipe = await get_object(Recipe.objects.only('id', 'author_id'), pk=pk)
+    representations = await sync_to_async(recipe_representations)(
+        request, [(recipe.id, recipe.author_id)])
+    if not representations:
+        raise exceptions.NotFound
+    return render(request, representations[0])
+
+
+def _open_pdf(digest, rows):
+    """Открытый PDF: собранный заново или сохранённый в кэш."""
+    if digest is None:
+        return shopping_cart.render_pdf(rows)
+    return shopping_cart.store_pdf(digest, rows)
+
+
+async def cart_pdf(user):
+    """Итоги читаются через ORM, файлы и сборка PDF идут в другом потоке."""
+    digest = None
+    if settings.SHOPPING_CART_PDF_CACHE_SIZE:
+        digest = await sync_to_async(shopping_cart.cart_digest)(user)
+        document = await sync_to_async(
+            shopping_cart.cached_pdf, thread_sensitive=False)(digest)
+        if document is not None:
+            return document
+    rows = [row async for row in shopping_cart.cart_queryset(user)]
+    return await sync_to_async(
+        _open_pdf, thread_sensitive=False)(digest, rows)
+
+
+async def read_chunks(document, size=FileResponse.block_size):
+    read = sync_to_async(document.read, thread_sensitive=False)
+    while True:
+        chunk = await read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+@read_view(renderer_classes=(PlainTextRenderer, CSVRenderer, PDFRenderer),
+           negotiation_class=FallbackContentNegotiation)
+async def download_shopping_cart(request):
+    if request.user.is_anonymous:
+        raise exceptions.NotAuthenticated
+    file_format = request.accepted_renderer.format
+    filename = f'cart.{file_format}'
+    if file_format == 'pdf':
+        document = await cart_pdf(request.user)
+        response = FileResponse(document, as_attachment=True,
+                                filename=filename,
+                                content_type='application/pdf')
+        # Синхронный итератор файла Django под ASGI прочитал бы целиком
+        response.streaming_content = read_chunks(document)
+        return response
+    response = StreamingHttpResponse(
+        shopping_cart.arender(
+            getattr(shopping_cart, f'render_{file_format}'),
+            shopping_cart.cart_queryset(request.user).aiterator()),
+        content_type=content_type(request.accepted_renderer))
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename}"')
+    return response
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.versioning import bump_version, get_version
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+CachedToken = namedtuple(
+    'CachedToken', ('user_id', 'version', 'db', 'token', 'user'))
+
+# Хэш пароля не попадает в общий кэш, при обращении он загружается из БД
+SHARED_EXCLUDE = {User: ('password',)}
+
+
+def _fields(model):
+    return tuple(field.attname for field in model._meta.concrete_fields)
+
+
+def _values(instance, exclude=()):
+    # Порядок полей модели, в нём from_db сопоставляет значения
+    return {name: getattr(instance, name)
+            for name in _fields(type(instance)) if name not in exclude}
+
+
+class TokenCache:
+    """LRU токенов в памяти процесса с ограниченным сроком жизни записи."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            expires, entry = self._entries.get(key, (0, None))
+            if expires <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+tokens = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+def _entry(version, user, token, exclude=None):
+    exclude = exclude or {}
+    return CachedToken(user.id, version, token._state.db,
+                       _values(token, exclude.get(Token, ())),
+                       _values(user, exclude.get(User, ())))
+
+
+def _shared_key(key):
+    return f'token:{key}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД для недавно виденных токенов.
+
+    Запись о токене действительна, пока не изменилась версия её
+    пользователя в общем кэше: версия растёт при удалении токена,
+    выходе и любом сохранении пользователя, в том числе деактивации.
+    Изменения в обход сигналов перестают действовать через
+    TOKEN_CACHE_TTL секунд. Для незнакомого токена сначала читается
+    только id пользователя, чтобы взять версию до загрузки. В общий кэш
+    пишутся все поля пользователя, кроме хэша пароля.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = tokens.get(key)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(_shared_key(key))
+            if entry is not None:
+                tokens.set(key, entry)
+        if entry is not None:
+            user_id = entry.user_id
+        else:
+            user_id = Token.objects.filter(key=key).values_list(
+                'user_id', flat=True).first()
+        # Версия читается до загрузки пользователя: изменение после чтения
+        # увеличит её, и загруженные данные не сохранятся как свежие
+        version = None if user_id is None else get_version(User, user_id)
+        if entry is not None and entry.version == version:
+            return self._restore(entry)
+        user, token = super().authenticate_credentials(key)
+        if user.id == user_id:
+            tokens.set(key, _entry(version, user, token))
+            if settings.TOKEN_CACHE_SHARED:
+                cache.set(_shared_key(key),
+                          _entry(version, user, token, SHARED_EXCLUDE),
+                          timeout=settings.TOKEN_CACHE_TTL)
+        return user, token
+
+    @staticmethod
+    def _restore(entry):
+        # Каждый запрос получает свои объекты, общие между потоками
+        # экземпляры моделей накапливали бы кэши связей
+        user = User.from_db(
+            entry.db, list(entry.user), list(entry.user.values()))
+        token = Token.from_db(
+            entry.db, list(entry.token), list(entry.token.values()))
+        token.user = user
+        return user, token
+
+
+def forget_user(user_id):
+    """Сброс закэшированных токенов пользователя во всех процессах."""
+    transaction.on_commit(lambda: bump_version(User, user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    forget_user(instance.id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def user_logged_out_everywhere(sender, user, **kwargs):
+    if user is not None and user.is_authenticated:
+        forget_user(user.id)
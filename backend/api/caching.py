@@ -0,0 +1,177 @@
+import gzip
+import time
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.versioning import get_version, get_with_versions
+from rest_framework.permissions import SAFE_METHODS
+from users.models import User
+
+from .serializers import RecipeSerializer, request_relations
+
+
+def cache_key(model, version):
+    return f'response:{model._meta.label_lower}:{version}'
+
+
+def version_etag(model, version):
+    return f'W/"{model._meta.model_name}-{version}"'
+
+
+def make_entry(content, content_type):
+    """Запись кэша: JSON, его сжатая копия и время создания."""
+    return {
+        'content': content,
+        'gzip': gzip.compress(content),
+        'content_type': content_type,
+        'last_modified': time.time(),
+    }
+
+
+def modified_since(request, entry):
+    """Изменились ли данные после даты из If-Modified-Since."""
+    since = parse_http_date_safe(
+        request.headers.get('If-Modified-Since', ''))
+    return since is None or int(entry['last_modified']) > since
+
+
+def cached_response(request, etag, entry):
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = HttpResponse(
+        entry['gzip'] if accepts_gzip else entry['content'],
+        content_type=entry['content_type'])
+    if accepts_gzip:
+        response['Content-Encoding'] = 'gzip'
+    set_cache_headers(response, etag, entry)
+    return response
+
+
+def not_modified(etag, entry):
+    response = HttpResponseNotModified()
+    set_cache_headers(response, etag, entry)
+    return response
+
+
+def set_cache_headers(response, etag, entry):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, no-cache'
+    if entry is not None:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+
+class VersionedCacheMixin:
+    """Кэширование полного списка объектов по версии модели.
+
+    Готовый JSON хранится в кэше вместе со сжатой копией. Версия модели
+    увеличивается сигналами при изменении данных, поэтому запрос
+    с актуальным If-None-Match получает 304 без обращения к БД.
+    """
+
+    def perform_authentication(self, request):
+        """Пользователь для чтения не нужен, токен не проверяется."""
+        if request.method not in SAFE_METHODS:
+            super().perform_authentication(request)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        model = self.get_queryset().model
+        version = get_version(model)
+        etag = version_etag(model, version)
+        key = cache_key(model, version)
+        if etag in request.headers.get('If-None-Match', ''):
+            return not_modified(etag, cache.get(key))
+        entry = cache.get(key)
+        if entry is None:
+            entry = self.render_entry(request, *args, **kwargs)
+            cache.set(key, entry, timeout=None)
+        if not modified_since(request, entry):
+            return not_modified(etag, entry)
+        return cached_response(request, etag, entry)
+
+    def render_entry(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        content = request.accepted_renderer.render(
+            response.data, request.accepted_media_type,
+            self.get_renderer_context())
+        content_type = request.accepted_media_type
+        if request.accepted_renderer.charset:
+            content_type += f'; charset={request.accepted_renderer.charset}'
+        return make_entry(content, content_type)
+
+
+def recipe_queryset():
+    """Рецепты со связанными данными для RecipeSerializer."""
+    return Recipe.objects.select_related('author').defer(
+        'search_vector'
+    ).prefetch_related(
+        'tags',
+        Prefetch('ingredients',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient')),
+    )
+
+
+def _recipe_key(origin, pk):
+    return f'recipe:{origin}:{pk}'
+
+
+def recipe_representations(request, recipes):
+    """Данные RecipeSerializer для пар (id рецепта, id автора).
+
+    Общая для всех пользователей часть рецепта хранится в кэше вместе
+    с версиями рецепта, автора, тегов и ингредиентов, из которых она
+    собрана, и читается одним get_many вместе с текущими версиями.
+    Флаги избранного, списка покупок и подписки подставляются из связей
+    пользователя при каждом ответе. Рецепты, которых уже нет в БД,
+    пропускаются.
+    """
+    recipes = list(recipes)
+    # Адреса фото абсолютные, поэтому записи кэша разные для каждого хоста
+    origin = request.build_absolute_uri('/')
+    keys = [_recipe_key(origin, pk) for pk, _ in recipes]
+    objects = [(Tag, None), (Ingredient, None)]
+    for pk, author_id in recipes:
+        objects += [(Recipe, pk), (User, author_id)]
+    found, versions = get_with_versions(keys, objects)
+    catalog, own = versions[:2], versions[2:]
+    bodies, missing = {}, {}
+    for number, (key, (pk, _)) in enumerate(zip(keys, recipes)):
+        dependencies = (*catalog, *own[2 * number:2 * number + 2])
+        entry = found.get(key)
+        if entry is not None and entry[0] == dependencies:
+            bodies[pk] = entry[1]
+        else:
+            missing[pk] = (key, dependencies)
+    if missing:
+        loaded = recipe_queryset().in_bulk(missing)
+        stored = {}
+        for data in RecipeSerializer(list(loaded.values()), many=True,
+                                     context={'request': request}).data:
+            body = {**data, 'is_favorited': False,
+                    'is_in_shopping_cart': False,
+                    'author': {**data['author'], 'is_subscribed': False}}
+            key, dependencies = missing[body['id']]
+            bodies[body['id']] = body
+            stored[key] = (dependencies, body)
+        cache.set_many(stored, timeout=None)
+    relations = request_relations(request)
+    representations = []
+    for pk, _ in recipes:
+        body = bodies.get(pk)
+        if body is None:
+            continue
+        author = body['author']
+        representations.append({
+            **body,
+            'is_favorited': pk in relations.favourites,
+            'is_in_shopping_cart': pk in relations.shopping_list,
+            'author': {**author,
+                       'is_subscribed': author['id'] in relations.follows},
+        })
+    return representations
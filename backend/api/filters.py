@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, When
 from django_filters.rest_framework import CharFilter, FilterSet, filters
+from recipes.autocomplete import ingredient_index
 from recipes.models import Ingredient, Recipe, Tag, User
+from recipes.search import SEARCH_CONFIG, recipe_search_index
 
 
 class RecipeFilter(FilterSet):
@@ -15,10 +21,12 @@ class RecipeFilter(FilterSet):
         method='get_is_in_shopping_cart'
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    search = CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
 
     def get_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -30,10 +38,30 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_list__user=self.request.user)
         return queryset
 
+    def get_search(self, queryset, name, value):
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(value, config=SEARCH_CONFIG,
+                                search_type='websearch')
+            return queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-id')
+        ids = recipe_search_index.search(
+            value, limit=settings.SEARCH_IDS_LIMIT)
+        return queryset.filter(id__in=ids).order_by(Case(
+            *(When(id=pk, then=position) for position, pk in enumerate(ids))
+        ))
+
 
 class IngredientFilter(FilterSet):
-    name = CharFilter(lookup_expr='startswith')
+    name = CharFilter(method='get_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+    def get_name(self, queryset, name, value):
+        ids = [entry.id for entry in ingredient_index.search(value)[
+            :settings.SEARCH_IDS_LIMIT]]
+        return queryset.filter(id__in=ids).order_by(Case(
+            *(When(id=pk, then=position) for position, pk in enumerate(ids))
+        ))
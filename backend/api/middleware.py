@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class RouteStats:
+    """Последние длительности запросов по маршрутам для перцентилей."""
+
+    def __init__(self, window):
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+
+    def add(self, route, duration):
+        with self._lock:
+            self._durations[route].append(duration)
+            self._counts[route] += 1
+
+    def summary(self):
+        with self._lock:
+            rows = [(route, self._counts[route], sorted(durations))
+                    for route, durations in self._durations.items()]
+        return [
+            {
+                'route': route,
+                'count': count,
+                'p50': self._percentile(durations, 50),
+                'p95': self._percentile(durations, 95),
+                'p99': self._percentile(durations, 99),
+                'max': durations[-1],
+            }
+            for route, count, durations in sorted(rows)
+        ]
+
+    @staticmethod
+    def _percentile(durations, percent):
+        index = max(0, -(-len(durations) * percent // 100) - 1)
+        return durations[index]
+
+
+route_stats = RouteStats(settings.REQUEST_TIMING_WINDOW)
+
+
+class QueryTimer:
+    """Число запросов к БД и время в них, через execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+# Таймер текущего запроса. Контекст копируется в потоки sync_to_async,
+# поэтому под ASGI учитываются и запросы async ORM
+request_queries = ContextVar('request_queries', default=None)
+
+
+def count_request_query(execute, sql, params, many, context):
+    timer = request_queries.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_request_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_request_query)
+
+
+class ServerTimingMiddleware:
+    """Время обработки запроса в заголовке Server-Timing и в логе.
+
+    Отдельно считаются SQL, работа вьюхи без SQL (для DRF это в основном
+    сериализация) и отрисовка ответа. Медленные запросы пишутся в лог,
+    длительности копятся по маршрутам для перцентилей.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        request._query_timer = QueryTimer()
+        token = request_queries.set(request._query_timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_queries.reset(token)
+        return self._finish(request, response, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        request._query_timer = QueryTimer()
+        token = request_queries.set(request._query_timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_queries.reset(token)
+        return self._finish(request, response, start)
+
+    def _finish(self, request, response, start):
+        end = time.perf_counter()
+        queries = request._query_timer
+        timings = self._timings(request, start, end)
+        total = timings['total']
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}'
+            + (f';desc="{queries.count} queries"' if name == 'db' else '')
+            for name, duration in timings.items()
+        )
+        route = self._route(request)
+        if route is not None:
+            route_stats.add(route, round(total * 1000, 1))
+        if (total * 1000 >= settings.SLOW_REQUEST_MS
+                or queries.count >= settings.SLOW_REQUEST_QUERIES):
+            self._log_slow(request, response, route, timings, queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_start = (time.perf_counter(),
+                               request._query_timer.duration)
+
+    def process_template_response(self, request, response):
+        request._view_end = (time.perf_counter(),
+                             request._query_timer.duration)
+        return response
+
+    @staticmethod
+    def _timings(request, start, end):
+        db = request._query_timer.duration
+        timings = {'total': end - start, 'db': db}
+        view_start = getattr(request, '_view_start', None)
+        view_end = getattr(request, '_view_end', None)
+        if view_start is not None and view_end is not None:
+            timings['view'] = (view_end[0] - view_start[0]
+                               - (view_end[1] - view_start[1]))
+            timings['render'] = end - view_end[0] - (db - view_end[1])
+        return timings
+
+    @staticmethod
+    def _route(request):
+        match = request.resolver_match
+        if match is None:
+            return None
+        return f'{request.method} /{match.route.lstrip("^").rstrip("$")}'
+
+    @staticmethod
+    def _log_slow(request, response, route, timings, queries):
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'queries': queries.count,
+            **{f'{name}_ms': round(duration * 1000, 1)
+               for name, duration in timings.items()},
+        }
+        logger.warning(
+            'Медленный запрос %s',
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'timing': fields},
+        )
+
+
+class AsyncReadMiddleware:
+    """Под ASGI запросы на чтение популярных адресов идут в async-вьюхи.
+
+    Для GET и HEAD подменяется корневой urlconf, остальные адреса и методы
+    обслуживаются теми же синхронными вьюхами. Под WSGI ничего не меняет.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if settings.ASYNC_READ_URLCONF and request.method in ('GET', 'HEAD'):
+            request.urlconf = settings.ASYNC_READ_URLCONF
+        return await self.get_response(request)
@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Постраничный вывод рецептов по курсору без COUNT и OFFSET.
+
+    Следующая страница выбирается условием по id последнего рецепта,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    """
+
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Курсор по записям ленты, упорядоченным по id рецепта."""
+
+    ordering = '-recipe_id'
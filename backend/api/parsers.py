@@ -0,0 +1,35 @@
+import io
+
+from django.conf import settings
+from rest_framework import exceptions, parsers, status
+
+
+class RequestTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большое тело запроса.'
+    default_code = 'request_too_large'
+
+
+class JSONParser(parsers.JSONParser):
+    """JSON с ограничением размера тела DATA_UPLOAD_MAX_MEMORY_SIZE.
+
+    Django проверяет размер только при чтении request.body, а DRF читает
+    поток запроса сам, поэтому без проверки тело с фото в base64 любого
+    размера попало бы в память целиком ещё до проверки поля.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if limit is not None:
+            request = parser_context['request']
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > limit:
+                raise RequestTooLarge
+            body = stream.read(limit + 1)
+            if len(body) > limit:
+                raise RequestTooLarge
+            stream = io.BytesIO(body)
+        return super().parse(stream, media_type, parser_context)
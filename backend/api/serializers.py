@@ -1,25 +1,95 @@
 import base64
-
-from django.shortcuts import get_object_or_404
+import binascii
+import tempfile
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from django.core.files.base import ContentFile
+from rest_framework.relations import MANY_RELATION_KWARGS
 
 from users.models import Follow, User
 from recipes.models import (Ingredient, RecipeIngredient, Recipe,
                             ShoppingList, Tag)
+from recipes.relations import relation_state
+from recipes.totals import change_recipe_in_totals
+
+
+def request_relations(request):
+    """Связи пользователя запроса, загружаются один раз на запрос."""
+    if not hasattr(request, '_relations'):
+        request._relations = relation_state(request.user)
+    return request._relations
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    if request is None:
+        return None
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None or not recipes_limit.isdigit():
+        return None
+    return int(recipes_limit)
 
 
 def ingredients_in_recipe(ingredients, recipe):
     RecipeIngredient.objects.bulk_create(
         [RecipeIngredient(
-            ingredient=get_object_or_404(Ingredient,
-                                         id=ingredient['ingredient']['id']),
+            ingredient_id=ingredient['ingredient']['id'],
             recipe=recipe,
             amount=ingredient['amount']
         ) for ingredient in ingredients]
     )
 
 
+def update_ingredients_in_recipe(ingredients, recipe):
+    """Изменение только добавленных, изменённых и удалённых ингредиентов.
+
+    Возвращает количество ингредиентов до и после изменения.
+    """
+    amounts = {ingredient['ingredient']['id']: ingredient['amount']
+               for ingredient in ingredients}
+    old_amounts = Counter()
+    current, removed = {}, []
+    for row in RecipeIngredient.objects.filter(recipe=recipe):
+        old_amounts[row.ingredient_id] += row.amount
+        if row.ingredient_id in amounts and row.ingredient_id not in current:
+            current[row.ingredient_id] = row
+        else:
+            removed.append(row.id)
+    changed = []
+    for ingredient_id, row in current.items():
+        if row.amount != amounts[ingredient_id]:
+            row.amount = amounts[ingredient_id]
+            changed.append(row)
+    if removed:
+        RecipeIngredient.objects.filter(id__in=removed).delete()
+    if changed:
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+    RecipeIngredient.objects.bulk_create(
+        [RecipeIngredient(ingredient_id=ingredient_id, recipe=recipe,
+                          amount=amount)
+         for ingredient_id, amount in amounts.items()
+         if ingredient_id not in current]
+    )
+    return old_amounts, amounts
+
+
+class ImageVariantField(serializers.ImageField):
+    """URL уменьшенной копии фото, а пока её нет — URL оригинала."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return super().to_representation(
+            getattr(recipe, f'image_{self.variant}') or recipe.image)
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -40,10 +110,13 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_medium = ImageVariantField('medium')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumbnail', 'image_medium',
+                  'cooking_time')
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -61,9 +134,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return request.user.follower.filter(author=obj).exists()
+        return obj.id in request_relations(request).follows
 
 
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -106,24 +177,23 @@ class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
     ingredients = IngredientInRecipeSerializer(many=True)
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_medium = ImageVariantField('medium')
 
     class Meta:
         model = Recipe
         fields = ['id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time']
+                  'image', 'image_thumbnail', 'image_medium',
+                  'text', 'cooking_time']
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return request.user.favourites.filter(recipe=obj).exists()
+        return obj.id in request_relations(request).favourites
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return request.user.shopping_list.filter(recipe=obj).exists()
+        return obj.id in request_relations(request).shopping_list
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -139,53 +209,121 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} байт.',
+    }
+    chunk_size = 64 * 1024
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(imgstr, 'temp.' + ext, format[len('data:'):])
 
         return super().to_internal_value(data)
 
+    def decode(self, imgstr, name, content_type):
+        """Декодирование base64 частями во временный файл."""
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(imgstr) // 4 * 3 > max_size + 2:
+            self.fail('too_large', max_size=max_size)
+        file = UploadedFile(
+            tempfile.SpooledTemporaryFile(
+                max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE),
+            name=name, content_type=content_type)
+        try:
+            for start in range(0, len(imgstr), self.chunk_size):
+                file.write(base64.b64decode(
+                    imgstr[start:start + self.chunk_size]))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_image')
+        file.size = file.tell()
+        if file.size > max_size:
+            file.close()
+            self.fail('too_large', max_size=max_size)
+        file.seek(0)
+        return file
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        try:
+            pks = [int(pk) for pk in data]
+        except (TypeError, ValueError):
+            self.child_relation.fail('incorrect_type',
+                                     data_type=type(data).__name__)
+        objects = self.child_relation.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                self.child_relation.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
 
 class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
+    tags = BulkPrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
     ingredients = RecipeIngredientCreateSerializer(many=True)
     author = UserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField()
     image = Base64ImageField(required=False, allow_null=True)
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_medium = ImageVariantField('medium')
 
     class Meta:
         model = Recipe
         fields = ['id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time']
+                  'image', 'image_thumbnail', 'image_medium',
+                  'text', 'cooking_time']
 
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], Prefetch(
+            'ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')))
+        return super().to_representation(instance)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         instance = super().create(validated_data)
         ingredients_in_recipe(ingredients, instance)
         return instance
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
         super().update(instance, validated_data)
-        ingredients_in_recipe(ingredients, instance)
+        old_amounts, new_amounts = update_ingredients_in_recipe(
+            ingredients, instance)
+        change_recipe_in_totals(instance.id, old_amounts, new_amounts)
         return instance
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return request.user.favourites.filter(recipe=obj).exists()
+        return obj.id in request_relations(request).favourites
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return request.user.shopping_list.filter(recipe=obj).exists()
+        return obj.id in request_relations(request).shopping_list
 
     def validate(self, attrs):
         ingredients = attrs['ingredients']
@@ -193,6 +331,16 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
             if int(ingredient.get('amount')) < 1:
                 raise serializers.ValidationError(
                     'Количество ингредиента должно быть больше 0!')
+        ingredient_ids = [ingredient['ingredient']['id']
+                          for ingredient in ingredients]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиенты в рецепте не должны повторяться!')
+        found = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = [str(pk) for pk in ingredient_ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(missing)}')
         cooking_time = attrs['cooking_time']
         if cooking_time < 1:
             raise serializers.ValidationError(
@@ -201,6 +349,8 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_medium = ImageVariantField('medium')
 
     class Meta:
         model = Recipe
@@ -208,6 +358,8 @@ class RecipeShortSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_thumbnail',
+            'image_medium',
             'cooking_time'
         )
 
@@ -226,7 +378,8 @@ class SubscribeSerializer(serializers.ModelSerializer):
         source='author.last_name')
     recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.IntegerField(
+        source='author.recipes_count', read_only=True)
 
     class Meta:
         model = Follow
@@ -237,16 +390,20 @@ class SubscribeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
-        return Follow.objects.filter(
-            author__following__user=request.user).exists()
+        if obj.user_id == request.user.id:
+            return True
+        return obj.author_id in request_relations(request).follows
 
     def get_recipes(self, obj):
-        recipes = obj.author.recipe.all()
+        if hasattr(obj.author, 'limited_recipes'):
+            recipes = obj.author.limited_recipes
+        else:
+            recipes = obj.author.recipe.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return SubscribeRecipeSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.author.recipe.all().count()
-
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
 
@@ -258,3 +415,13 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         model = ShoppingList
         fields = ['id', 'name', 'image', 'cooking_time']
         read_only_fields = ('name', 'image', 'cooking_time')
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для массового добавления и удаления."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS,
+    )
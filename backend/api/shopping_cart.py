@@ -0,0 +1,221 @@
+import csv
+import hashlib
+import os
+import tempfile
+from contextlib import suppress
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Sum
+from recipes.models import Ingredient
+from recipes.versioning import get_version
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_BOLD_FONT_NAME = 'ShoppingCartFontBold'
+PDF_MARGIN = 50
+PDF_INDENT = 12
+PDF_LINE_HEIGHT = 18
+# Меняется вместе с оформлением, чтобы не отдавать PDF из кэша в старом
+PDF_LAYOUT_VERSION = 2
+
+
+def cart_queryset(user):
+    """Суммарное количество ингредиентов из списка покупок пользователя."""
+    return (
+        user.shopping_list_totals
+        .values('ingredient__name', 'ingredient__measurement_unit')
+        .annotate(amount=Sum('amount'))
+        .order_by('ingredient__name')
+    )
+
+
+def cart_ingredients(user):
+    return cart_queryset(user).iterator()
+
+
+def _rows(ingredients):
+    for ingredient in ingredients:
+        yield (ingredient['ingredient__name'],
+               ingredient['amount'],
+               ingredient['ingredient__measurement_unit'])
+
+
+def render_txt(ingredients, header=True):
+    for name, amount, measurement_unit in _rows(ingredients):
+        yield f'{name}: {amount}, {measurement_unit}\n'
+
+
+class _Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(ingredients, header=True):
+    writer = csv.writer(_Echo())
+    if header:
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Единицы измерения'))
+    for row in _rows(ingredients):
+        yield writer.writerow(row)
+
+
+async def arender(render, ingredients):
+    """Строки файла по асинхронному итератору ингредиентов.
+
+    Каждый ингредиент передаётся render отдельно, заголовок выводится
+    один раз в начале.
+    """
+    for line in render(()):
+        yield line.encode()
+    async for ingredient in ingredients:
+        for line in render((ingredient,), header=False):
+            yield line.encode()
+
+
+def _register_font(name, path, fallback):
+    if name in pdfmetrics.getRegisteredFontNames():
+        return name
+    if not path:
+        return fallback
+    try:
+        pdfmetrics.registerFont(TTFont(name, path))
+    except (OSError, TTFError):
+        return fallback
+    return name
+
+
+def _pdf_fonts():
+    """Шрифты с кириллицей из настроек, иначе встроенный Helvetica."""
+    regular = _register_font(
+        PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT, 'Helvetica')
+    bold = _register_font(
+        PDF_BOLD_FONT_NAME, settings.SHOPPING_CART_PDF_BOLD_FONT,
+        'Helvetica-Bold' if regular == 'Helvetica' else regular)
+    return regular, bold
+
+
+def _groups(ingredients):
+    """Ингредиенты, сгруппированные по первой букве названия."""
+    rows = sorted(_rows(ingredients), key=lambda row: row[0].casefold())
+    return groupby(rows, key=lambda row: row[0][:1].upper())
+
+
+def render_pdf(ingredients, document=None):
+    """PDF со списком, разбитым на группы по алфавиту.
+
+    Без файла документ собирается во временный файл, который затем
+    отдаётся частями.
+    """
+    if document is None:
+        document = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    pdf = canvas.Canvas(document, pagesize=A4)
+    regular, bold = _pdf_fonts()
+    width, height = A4
+    right = width - PDF_MARGIN
+    pdf.setFont(bold, 16)
+    pdf.drawString(PDF_MARGIN, height - PDF_MARGIN, 'Список покупок')
+    y = height - PDF_MARGIN - 2 * PDF_LINE_HEIGHT
+    for letter, rows in _groups(ingredients):
+        # Заголовок группы не остаётся внизу страницы без строк
+        if y < PDF_MARGIN + 2 * PDF_LINE_HEIGHT:
+            pdf.showPage()
+            y = height - PDF_MARGIN
+        pdf.setFont(bold, 13)
+        pdf.drawString(PDF_MARGIN, y, letter)
+        y -= PDF_LINE_HEIGHT
+        pdf.setFont(regular, 12)
+        for name, amount, measurement_unit in rows:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(regular, 12)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN + PDF_INDENT, y, f'• {name}')
+            pdf.drawRightString(right, y, f'{amount} {measurement_unit}')
+            y -= PDF_LINE_HEIGHT
+        y -= PDF_LINE_HEIGHT / 2
+    pdf.save()
+    document.seek(0)
+    return document
+
+
+def cart_digest(user):
+    """Хэш итогов списка покупок, под ним PDF хранится в кэше.
+
+    В хэш входят версия справочника ингредиентов, от которой зависят
+    названия, и версия оформления документа.
+    """
+    digest = hashlib.sha256(
+        f'{PDF_LAYOUT_VERSION}:{get_version(Ingredient)}'.encode())
+    for pk, amount in (user.shopping_list_totals.order_by('ingredient_id')
+                       .values_list('ingredient_id', 'amount')):
+        digest.update(f';{pk}:{amount}'.encode())
+    return digest.hexdigest()
+
+
+def _cache_path(digest):
+    return os.path.join(settings.SHOPPING_CART_PDF_CACHE_DIR, f'{digest}.pdf')
+
+
+def cached_pdf(digest):
+    """Открытый ранее собранный PDF или None.
+
+    Время изменения файла обновляется при каждом чтении, по нему
+    вытесняются давно не запрошенные документы.
+    """
+    try:
+        document = open(_cache_path(digest), 'rb')
+    except FileNotFoundError:
+        return None
+    with suppress(FileNotFoundError):
+        os.utime(document.fileno())
+    return document
+
+
+def store_pdf(digest, ingredients):
+    """Сборка PDF в кэш на диске, возвращает открытый файл."""
+    directory = settings.SHOPPING_CART_PDF_CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp',
+                                     delete=False) as document:
+        try:
+            render_pdf(ingredients, document)
+        except BaseException:
+            os.remove(document.name)
+            raise
+    path = _cache_path(digest)
+    os.replace(document.name, path)
+    document = open(path, 'rb')
+    evict_pdfs(settings.SHOPPING_CART_PDF_CACHE_SIZE)
+    return document
+
+
+def evict_pdfs(max_size):
+    """Удаление давно не запрошенных PDF, пока кэш больше max_size байт."""
+    files = []
+    for entry in os.scandir(settings.SHOPPING_CART_PDF_CACHE_DIR):
+        if not entry.name.endswith('.pdf'):
+            continue
+        with suppress(FileNotFoundError):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        with suppress(FileNotFoundError):
+            os.remove(path)
+        total -= size
+
+
+def cart_pdf(user):
+    """PDF списка покупок: из кэша, если итоги не менялись, иначе новый."""
+    if not settings.SHOPPING_CART_PDF_CACHE_SIZE:
+        return render_pdf(cart_ingredients(user))
+    digest = cart_digest(user)
+    return cached_pdf(digest) or store_pdf(digest, cart_ingredients(user))
@@ -0,0 +1,91 @@
+import json
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+from recipes.relations import shopping_list
+from rest_framework.authtoken.models import Token
+
+from .utils import APITestCase, create_recipe
+
+
+class AsyncViewsTest(APITestCase):
+    """Async-вьюхи под ASGI отвечают так же, как синхронные под WSGI."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            SHOPPING_CART_PDF_CACHE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.token = Token.objects.create(user=self.user)
+        self.recipes = [
+            create_recipe(self.author, self.tags[:2], self.ingredients[:3])
+            for _ in range(8)]
+        shopping_list.add(self.user, [recipe.id for recipe in self.recipes])
+
+    @async_to_sync
+    async def async_get(self, path, **headers):
+        response = await self.async_client.get(path, headers={
+            'Authorization': f'Token {self.token.key}', **headers})
+        if response.streaming:
+            response.body = b''.join(
+                [chunk async for chunk in response.streaming_content])
+        else:
+            response.body = response.content
+        return response
+
+    def sync_get(self, path, **headers):
+        response = self.client.get(path, headers=headers)
+        response.body = b''.join(response) if response.streaming else (
+            response.content)
+        return response
+
+    def assertSameResponse(self, path, **headers):
+        expected = self.sync_get(path, **headers)
+        response = self.async_get(path, **headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        if expected['Content-Type'] == 'application/json':
+            self.assertEqual(json.loads(response.body),
+                             json.loads(expected.body))
+        else:
+            self.assertEqual(response.body, expected.body)
+        return response
+
+    def test_json_endpoints(self):
+        recipe = self.recipes[0]
+        for path in ('/api/tags/', f'/api/tags/{self.tags[0].id}/',
+                     '/api/ingredients/', '/api/ingredients/?name=ингр',
+                     f'/api/recipes/{recipe.id}/', '/api/recipes/?page=999',
+                     f'/api/recipes/?author={self.author.id}&limit=3'):
+            with self.subTest(path=path):
+                self.assertSameResponse(path)
+
+    def test_recipe_pages(self):
+        for page in ('1', '2', '3', 'last', 'x'):
+            with self.subTest(page=page):
+                self.assertSameResponse(f'/api/recipes/?page={page}&limit=3')
+
+    def test_shopping_cart_files(self):
+        for file_format in ('txt', 'csv', 'pdf'):
+            with self.subTest(file_format=file_format):
+                response = self.assertSameResponse(
+                    f'/api/recipes/download_shopping_cart/'
+                    f'?format={file_format}')
+                self.assertTrue(response.is_async)
+                self.assertEqual(
+                    response['Content-Disposition'],
+                    f'attachment; filename="cart.{file_format}"')
+
+    def test_shopping_cart_unacceptable_falls_back_to_txt(self):
+        path = '/api/recipes/download_shopping_cart/'
+        expected = self.sync_get(path, Accept='text/plain')
+        response = self.assertSameResponse(path, Accept='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(response.body, expected.body)
+        self.assertEqual(
+            self.sync_get(f'{path}?format=json').status_code, 404)
@@ -0,0 +1,62 @@
+from unittest import mock
+
+from api import authentication
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+from .utils import APITestCase
+
+
+@override_settings(TOKEN_CACHE_SHARED=True)
+class CachedTokenAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        authentication.tokens._entries.clear()
+        self.addCleanup(authentication.tokens._entries.clear)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_shared_entry_has_no_password(self):
+        self.assertEqual(self.me().status_code, 200)
+        entry = cache.get(f'token:{self.token.key}')
+        self.assertNotIn('password', entry.user)
+        self.assertEqual(entry.user['email'], self.user.email)
+        authentication.tokens._entries.clear()
+        with self.assertNumQueries(0):
+            user, token = authentication.CachedTokenAuthentication(
+            ).authenticate_credentials(self.token.key)
+        self.assertEqual((user.id, user.is_active, token.key),
+                         (self.user.id, True, self.token.key))
+
+    def test_warm_me_does_not_load_user(self):
+        self.me()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().json()['email'], self.user.email)
+        authentication.tokens._entries.clear()
+        self.me()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().json()['username'],
+                             self.user.username)
+
+    def test_change_during_lookup_is_not_cached_as_fresh(self):
+        lookup = authentication.TokenAuthentication.authenticate_credentials
+
+        def deactivated_during_lookup(auth, key):
+            result = lookup(auth, key)
+            User.objects.filter(id=self.user.id).update(is_active=False)
+            authentication.bump_version(User, self.user.id)
+            return result
+
+        with mock.patch.object(
+                authentication.TokenAuthentication,
+                'authenticate_credentials', deactivated_during_lookup):
+            self.assertEqual(self.me().status_code, 200)
+        self.assertEqual(self.me().status_code, 401)
@@ -0,0 +1,99 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Favourites, FeedEntry, Recipe
+from users.models import Follow, User
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class BulkRelationTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [
+            create_recipe(self.author, self.tags[:1], self.ingredients[:2])
+            for _ in range(3)]
+        self.ids = [recipe.id for recipe in self.recipes]
+
+    def bulk(self, method, path, ids):
+        response = getattr(self.client, method)(
+            path, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['status']
+                for item in response.json()['results']}
+
+    def favourites_counts(self):
+        return list(Recipe.objects.filter(id__in=self.ids).order_by(
+            'id').values_list('favourites_count', flat=True))
+
+    def test_favourites(self):
+        missing = max(self.ids) + 1
+        self.assertEqual(
+            self.bulk('post', '/api/recipes/favorite/',
+                      [*self.ids[:2], missing]),
+            {self.ids[0]: 'added', self.ids[1]: 'added',
+             missing: 'not_found'})
+        self.assertEqual(
+            self.bulk('post', '/api/recipes/favorite/', self.ids),
+            {self.ids[0]: 'already_added', self.ids[1]: 'already_added',
+             self.ids[2]: 'added'})
+        self.assertEqual(self.favourites_counts(), [1, 1, 1])
+        self.assertEqual(
+            self.bulk('delete', '/api/recipes/favorite/', self.ids[1:]),
+            {self.ids[1]: 'removed', self.ids[2]: 'removed'})
+        self.assertEqual(
+            self.bulk('delete', '/api/recipes/favorite/', self.ids[1:]),
+            {self.ids[1]: 'not_added', self.ids[2]: 'not_added'})
+        self.assertEqual(self.favourites_counts(), [1, 0, 0])
+        self.assertEqual(
+            list(Favourites.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True)), self.ids[:1])
+
+    def test_shopping_cart(self):
+        self.bulk('post', '/api/recipes/shopping_cart/', self.ids)
+        self.assertEqual(
+            self.bulk('delete', '/api/recipes/shopping_cart/', self.ids[:1]),
+            {self.ids[0]: 'removed'})
+        in_cart = self.client.get(
+            '/api/recipes/', {'is_in_shopping_cart': 1}).json()['results']
+        self.assertEqual(sorted(recipe['id'] for recipe in in_cart),
+                         self.ids[1:])
+
+    def test_subscribe(self):
+        other = create_user('other')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(
+                self.bulk('post', '/api/users/subscribe/',
+                          [self.author.id, other.id, self.user.id]),
+                {self.author.id: 'added', other.id: 'added',
+                 self.user.id: 'self'})
+        self.assertEqual(
+            User.objects.get(id=self.author.id).followers_count, 1)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bulk('delete', '/api/users/subscribe/', [self.author.id])
+        self.assertEqual(
+            User.objects.get(id=self.author.id).followers_count, 0)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.user).values_list(
+                'author_id', flat=True)), [other.id])
+
+    def test_queries_do_not_grow_with_ids(self):
+        queries = []
+        for ids in (self.ids[:1], self.ids):
+            for method in ('post', 'delete'):
+                with CaptureQueriesContext(connection) as captured:
+                    self.bulk(method, '/api/recipes/favorite/', ids)
+                queries.append(len(captured))
+        self.assertEqual(queries[:2], queries[2:])
+
+    def test_single_add_twice(self):
+        recipe = self.recipes[0]
+        for path in (f'/api/recipes/{recipe.id}/favorite/',
+                     f'/api/recipes/{recipe.id}/shopping_cart/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.post(path).status_code, 201)
+                self.assertEqual(self.client.post(path).status_code, 400)
+        self.assertEqual(self.favourites_counts()[0], 1)
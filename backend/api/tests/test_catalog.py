@@ -0,0 +1,103 @@
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from recipes.autocomplete import IngredientIndex
+from recipes.models import Ingredient, Tag
+
+from .utils import APITestCase, create_user
+
+
+class CatalogCacheTest(APITestCase):
+    """Ответы справочников сбрасываются при изменении данных."""
+
+    def get(self, path, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def test_not_modified(self):
+        etag = self.get('/api/tags/')['ETag']
+        self.assertEqual(self.get('/api/tags/', etag).status_code, 304)
+
+    def test_tag_saved(self):
+        etag = self.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Новый', slug='new', color='#FFFFFF')
+        response = self.get('/api/tags/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('new', [tag['slug'] for tag in response.json()])
+
+    def test_loaddata(self):
+        etag = self.get('/api/ingredients/')['ETag']
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', encoding='utf-8') as file:
+            file.write('Шафран,г\n')
+            file.flush()
+            call_command('loaddata', file.name, stdout=StringIO())
+        response = self.get('/api/ingredients/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Шафран',
+                      [ingredient['name'] for ingredient in response.json()])
+        search = self.client.get('/api/ingredients/', {'name': 'шаф'})
+        self.assertEqual([ingredient['name'] for ingredient in search.json()],
+                         ['Шафран'])
+
+
+class IngredientAutocompleteTest(APITestCase):
+    """Поиск ингредиентов: сначала по началу названия, затем по подстроке."""
+
+    def search(self, name):
+        return [ingredient['name'] for ingredient in self.client.get(
+            '/api/ingredients/', {'name': name}).json()]
+
+    def test_prefix_before_substring(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Морская соль', 'Солод', 'Соль', 'Фасоль'))
+        self.assertEqual(self.search('СОЛ'),
+                         ['Солод', 'Соль', 'Морская соль', 'Фасоль'])
+        self.assertEqual(self.search('соль'),
+                         ['Соль', 'Морская соль', 'Фасоль'])
+        self.assertEqual(self.search('тмин'), [])
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.search('ингредиент 1'), ['Ингредиент 1'])
+        ingredient = self.ingredients[1]
+        ingredient.name = 'Тмин'
+        ingredient.save()
+        Ingredient.objects.create(name='Ингредиент 11', measurement_unit='г')
+        self.assertEqual(self.search('ингредиент 1'), ['Ингредиент 11'])
+
+    def test_static_index_does_not_query(self):
+        index = IngredientIndex([
+            (1, 'Сахар', 'г'), (2, 'Ванильный сахар', 'г'), (3, 'Перец', 'г')])
+        with self.assertNumQueries(0):
+            self.assertEqual([entry.id for entry in index.search('сах')],
+                             [1, 2])
+            self.assertEqual([entry.id for entry in index.search(' ')],
+                             [2, 3, 1])
+
+
+class IngredientAdminSearchTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = create_user('admin')
+        self.admin.is_staff = self.admin.is_superuser = True
+        self.admin.save()
+
+    def search(self, term):
+        self.client.force_login(self.admin)
+        return [result['text'] for result in self.client.get(
+            '/admin/autocomplete/', {
+                'app_label': 'recipes', 'model_name': 'recipeingredient',
+                'field_name': 'ingredient', 'term': term,
+            }).json()['results']]
+
+    def test_ranked_by_index(self):
+        self.assertEqual(self.search('ингредиент 3'), ['Ингредиент 3'])
+
+    @override_settings(SEARCH_IDS_LIMIT=2)
+    def test_candidates_are_capped(self):
+        self.assertEqual(len(self.search('ингредиент')), 2)
@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from recipes.counters import change_counter, counter_drift
+from recipes.models import Recipe
+from users.models import User
+
+from .utils import APITestCase, create_recipe
+
+
+class CountersTest(APITestCase):
+    """Счётчики меняются сигналами и сверяются reconcile_counters."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.author, self.tags[:1],
+                                    self.ingredients[:2])
+
+    def counters(self):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        return (self.recipe.favourites_count, self.author.recipes_count,
+                self.author.followers_count)
+
+    def test_signals(self):
+        self.assertEqual(self.counters(), (0, 1, 0))
+        self.user.favourites.create(recipe=self.recipe)
+        self.user.follower.create(author=self.author)
+        create_recipe(self.author, self.tags[:1], self.ingredients[:1])
+        self.assertEqual(self.counters(), (1, 2, 1))
+        self.user.favourites.all().delete()
+        self.user.follower.all().delete()
+        self.assertEqual(self.counters(), (0, 2, 0))
+        Recipe.objects.filter(author=self.author).delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+        self.assertEqual(list(counter_drift()), [])
+
+    def test_counter_does_not_go_below_zero(self):
+        change_counter(Recipe, 'favourites_count', self.recipe.id, -1)
+        self.assertEqual(self.counters()[0], 0)
+
+    def test_reconcile(self):
+        self.user.favourites.create(recipe=self.recipe)
+        Recipe.objects.filter(id=self.recipe.id).update(favourites_count=5)
+        User.objects.filter(id=self.author.id).update(recipes_count=0,
+                                                      followers_count=3)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', check=True, stdout=StringIO())
+        self.assertEqual(self.counters(), (5, 0, 3))
+        output = StringIO()
+        call_command('reconcile_counters', stdout=output)
+        self.assertIn('Исправлено счётчиков: 3', output.getvalue())
+        self.assertEqual(self.counters(), (1, 1, 0))
+        self.assertEqual(list(counter_drift()), [])
@@ -0,0 +1,74 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.feed import resume_fan_out
+from recipes.models import FeedEntry
+from users.models import Follow, User
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+@override_settings(FEED_FANOUT_LIMIT=2, FEED_FANOUT_RESUME_LIMIT=1)
+class FeedTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = create_user('reader')
+        self.small = create_user('small')
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.user, author=self.small)
+            Follow.objects.create(user=self.user, author=self.author)
+            Follow.objects.create(user=self.reader, author=self.author)
+            self.recipes = [
+                create_recipe(author, self.tags[:1], self.ingredients[:2])
+                for author in (self.small, self.author) * 3]
+
+    def feed_ids(self, url='/api/recipes/feed/?limit=2'):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            ids += [recipe['id'] for recipe in page['results']]
+            url = page['next']
+        return ids
+
+    def test_large_author_recipes_are_merged_at_read(self):
+        self.assertTrue(User.objects.get(id=self.author.id).feed_pulled)
+        self.assertFalse(FeedEntry.objects.filter(author=self.author).exists())
+        entries = FeedEntry.objects.count()
+        self.assertEqual(self.feed_ids(), sorted(
+            (recipe.id for recipe in self.recipes), reverse=True))
+        self.assertEqual(FeedEntry.objects.count(), entries)
+
+    def test_unfollowed_author_is_not_merged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertEqual(self.feed_ids(), sorted(
+            (recipe.id for recipe in self.recipes
+             if recipe.author_id == self.small.id), reverse=True))
+
+    def test_fan_out_resumes_offline(self):
+        expected = self.feed_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(
+                user=self.reader, author=self.author).delete()
+        self.assertFalse(FeedEntry.objects.filter(author=self.author).exists())
+        self.assertEqual(self.feed_ids(), expected)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(resume_fan_out(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(id=self.author.id).update(followers_count=0)
+            self.assertEqual(resume_fan_out(), 1)
+        self.assertFalse(User.objects.get(id=self.author.id).feed_pulled)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user,
+                                     author=self.author).count(), 3)
+        self.assertEqual(self.feed_ids(), expected)
+
+    def test_pages_cost_the_same(self):
+        self.feed_ids()
+        url, queries = '/api/recipes/feed/?limit=2', set()
+        while url:
+            with CaptureQueriesContext(connection) as captured:
+                url = self.client.get(url).json()['next']
+            queries.add(len(captured))
+        self.assertEqual(len(queries), 1)
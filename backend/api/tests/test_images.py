@@ -0,0 +1,81 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from PIL import Image
+from recipes.models import Recipe
+
+from .utils import APITestCase, create_recipe
+
+
+def image_data(color):
+    buffer = BytesIO()
+    Image.new('RGB', (400, 300), color).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(RECIPE_IMAGE_WORKERS=0)
+class RecipeImageTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_root = override_settings(MEDIA_ROOT=media)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.recipe = create_recipe(self.user, self.tags[:1],
+                                    self.ingredients[:2])
+
+    def body(self, image):
+        return {
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 5}],
+            'tags': [self.tags[0].id], 'name': 'Рецепт', 'text': 'Текст',
+            'cooking_time': 5, 'image': image,
+        }
+
+    def update(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', self.body(image),
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        return [self.recipe.image_thumbnail.name,
+                self.recipe.image_medium.name]
+
+    def test_replaced_and_deleted_variants_are_removed(self):
+        first = self.update(image_data('red'))
+        self.assertTrue(all(map(default_storage.exists, first)))
+        second = self.update(image_data('blue'))
+        self.assertTrue(all(map(default_storage.exists, second)))
+        self.assertFalse(any(map(default_storage.exists, first)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertFalse(any(map(default_storage.exists, second)))
+
+    def test_removed_image_drops_variants(self):
+        names = self.update(image_data('red'))
+        self.assertEqual(self.update(None), [None, None])
+        self.assertFalse(any(map(default_storage.exists, names)))
+
+    def test_shared_variants_are_kept(self):
+        names = self.update(image_data('red'))
+        Recipe.objects.filter(pk=create_recipe(
+            self.user, self.tags[:1], self.ingredients[:1]).pk).update(
+                image=self.recipe.image.name,
+                image_thumbnail=names[0], image_medium=names[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertTrue(all(map(default_storage.exists, names)))
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_body_is_rejected_before_parsing(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/', self.body(image_data('red')),
+            format='json')
+        self.assertEqual(response.status_code, 413)
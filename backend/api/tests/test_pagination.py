@@ -0,0 +1,42 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .utils import APITestCase, create_recipe
+
+
+class RecipeCursorPaginationTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [
+            create_recipe(self.author, self.tags[:1], self.ingredients[:2])
+            for _ in range(7)]
+
+    def pages(self, url):
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).json()
+            yield page, len(queries)
+            url = page['next']
+
+    def test_walks_all_recipes_newest_first(self):
+        pages = list(self.pages('/api/recipes/?pagination=cursor&limit=3'))
+        self.assertEqual(
+            [recipe['id'] for page, _ in pages for recipe in page['results']],
+            sorted((recipe.id for recipe in self.recipes), reverse=True))
+        self.assertNotIn('count', pages[0][0])
+        self.assertEqual(len(pages), 3)
+
+    def test_new_recipe_does_not_shift_pages(self):
+        pages = self.pages('/api/recipes/?pagination=cursor&limit=3')
+        first, _ = next(pages)
+        create_recipe(self.author, self.tags[:1], self.ingredients[:2])
+        second, _ = next(pages)
+        self.assertEqual(second['results'][0]['id'],
+                         first['results'][-1]['id'] - 1)
+
+    def test_deep_pages_cost_the_same(self):
+        list(self.pages('/api/recipes/?pagination=cursor&limit=2'))
+        queries = {count for _, count in
+                   self.pages('/api/recipes/?pagination=cursor&limit=2')}
+        self.assertEqual(len(queries), 1)
@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+from django.db import connection
+from django.test import SimpleTestCase
+from foodgram.db import pool
+from foodgram.db.sqlite3.base import DatabaseWrapper
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def check(connection):
+    pass
+
+
+def reset(connection):
+    if connection.closed:
+        raise RuntimeError
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = pool.ConnectionPool(
+            min_size=0, max_size=2, timeout=0.1, max_lifetime=60,
+            max_idle=60, check_idle=60)
+
+    def test_released_connection_is_reused(self):
+        first = self.pool.acquire(FakeConnection, check)
+        self.pool.release(first, reset)
+        self.assertIs(self.pool.acquire(FakeConnection, check), first)
+        self.assertEqual(self.pool.stats()['created'], 1)
+
+    def test_failed_reset_closes_connection(self):
+        first = self.pool.acquire(FakeConnection, check)
+        first.closed = True
+        self.pool.release(first, reset)
+        self.assertIsNot(self.pool.acquire(FakeConnection, check), first)
+        self.assertEqual(self.pool.stats()['closed'], 1)
+
+    def test_pools_are_keyed_by_connection_params(self):
+        def get(database):
+            return pool.get_pool('pool-test', {'database': database}, {})
+
+        self.addCleanup(lambda: [
+            pool._pools.pop(key) for key in list(pool._pools)
+            if key[0] == 'pool-test'])
+        self.assertIs(get('first'), get('first'))
+        self.assertIsNot(get('first'), get('second'))
+        self.assertEqual(len(pool.pool_stats()['pool-test']), 2)
+
+
+class PooledWrapperTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(directory.name, 'pool.sqlite3'),
+        }, alias='pool-wrapper-test')
+        self.addCleanup(self.wrapper.close)
+        self.addCleanup(lambda: [
+            pool._pools.pop(key) for key in list(pool._pools)
+            if key[0] == 'pool-wrapper-test'])
+
+    def reconnect(self, statement):
+        self.wrapper.ensure_connection()
+        first = self.wrapper.connection
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(statement)
+        self.wrapper.close()
+        self.wrapper.ensure_connection()
+        return first, self.wrapper.connection
+
+    def test_connection_returns_to_pool(self):
+        first, second = self.reconnect('SELECT 1')
+        self.assertIs(first, second)
+
+    def test_session_with_temp_table_is_not_reused(self):
+        first, second = self.reconnect('CREATE TEMP TABLE scratch (id int)')
+        self.assertIsNot(first, second)
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT name FROM temp.sqlite_master')
+            self.assertEqual(cursor.fetchall(), [])
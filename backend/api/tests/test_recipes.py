@@ -0,0 +1,190 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .utils import APITestCase, create_recipe
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от числа рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.user.follower.create(author=self.author)
+
+    def create_recipes(self, count):
+        recipes = [
+            create_recipe(self.author, self.tags[:2],
+                          self.ingredients[number:number + 3])
+            for number in range(count)]
+        self.user.favourites.create(recipe=recipes[0])
+        self.user.shopping_list.create(recipe=recipes[-1])
+        return recipes
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['results']
+
+    def test_query_budget(self):
+        self.create_recipes(6)
+        with self.assertNumQueries(8):
+            self.client.get('/api/recipes/')
+        with self.assertNumQueries(2):
+            self.client.get('/api/recipes/')
+
+    def test_queries_do_not_grow_with_page(self):
+        self.create_recipes(2)
+        small, _ = self.list_queries()
+        self.create_recipes(4)
+        super().setUp()
+        full, results = self.list_queries()
+        self.assertEqual(small, full)
+        self.assertEqual(len(results), 6)
+
+    def test_flags(self):
+        recipes = self.create_recipes(3)
+        _, results = self.list_queries()
+        flags = {recipe['id']: (recipe['is_favorited'],
+                                recipe['is_in_shopping_cart'],
+                                recipe['author']['is_subscribed'])
+                 for recipe in results}
+        self.assertEqual(flags, {
+            recipes[0].id: (True, False, True),
+            recipes[1].id: (False, False, True),
+            recipes[2].id: (False, True, True),
+        })
+        anonymous = self.client_class().get('/api/recipes/').json()
+        self.assertFalse(any(
+            recipe['is_favorited'] or recipe['author']['is_subscribed']
+            for recipe in anonymous['results']))
+
+
+class RecipeWriteTest(APITestCase):
+    """Запись рецепта: проверка списком и изменение только различий."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+
+    def update(self, recipe, ingredients, tags):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/recipes/{recipe.id}/', {
+                'ingredients': [{'id': pk, 'amount': amount}
+                                for pk, amount in ingredients],
+                'tags': tags, 'name': 'Рецепт', 'text': 'Текст',
+                'cooking_time': 5,
+            }, format='json')
+        return response, len(queries)
+
+    def rows(self, recipe):
+        return {row.ingredient_id: (row.id, row.amount)
+                for row in recipe.ingredients.all()}
+
+    def ids(self, objects):
+        return [item.id for item in objects]
+
+    def test_only_changes_are_written(self):
+        recipe = create_recipe(self.author, self.tags[:1],
+                               self.ingredients[:3])
+        before = self.rows(recipe)
+        first, second, third, added = self.ids(self.ingredients[:4])
+        response, _ = self.update(
+            recipe, ((first, 10), (second, 4), (added, 7)),
+            self.ids(self.tags[1:]))
+        self.assertEqual(response.status_code, 200)
+        after = self.rows(recipe)
+        self.assertEqual(after[first], before[first])
+        self.assertEqual(after[second], (before[second][0], 4))
+        self.assertNotIn(third, after)
+        self.assertEqual(after[added][1], 7)
+        self.assertEqual(response.json()['tags'], self.ids(self.tags[1:]))
+        self.assertEqual(
+            [ingredient['amount'] for ingredient in
+             response.json()['ingredients']], [10, 4, 7])
+
+    def test_queries_do_not_grow_with_ingredients(self):
+        ingredients = self.ids(self.ingredients)
+        small = create_recipe(self.author, self.tags[:1],
+                              self.ingredients[:2])
+        large = create_recipe(self.author, self.tags[:1],
+                              self.ingredients[:5])
+        # Состояние связей пользователя кэшируется первым запросом
+        self.client.get('/api/recipes/')
+        _, few = self.update(
+            small, ((ingredients[0], 1), (ingredients[2], 1)),
+            self.ids(self.tags[1:2]))
+        _, many = self.update(
+            large, [(pk, 1) for pk in ingredients[:3]]
+            + [(pk, 10) for pk in ingredients[5:]],
+            self.ids(self.tags[1:]))
+        self.assertEqual(few, many)
+
+    def test_invalid_ids_are_reported_together(self):
+        recipe = create_recipe(self.author, self.tags[:1],
+                               self.ingredients[:2])
+        first = self.ingredients[0].id
+        missing = max(self.ids(self.ingredients)) + 1
+        response, _ = self.update(
+            recipe, ((first, 1), (missing, 1), (missing + 1, 1)),
+            self.ids(self.tags[:1]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'{missing}, {missing + 1}', str(response.json()))
+        response, _ = self.update(
+            recipe, ((first, 1), (first, 2)), self.ids(self.tags[:1]))
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.update(
+            recipe, ((first, 1),), [self.tags[0].id, missing])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tags', response.json())
+        self.assertEqual(self.rows(recipe).keys(),
+                         set(self.ids(self.ingredients[:2])))
+
+
+class RecipeRepresentationCacheTest(APITestCase):
+    """Общая часть рецепта кэшируется, флаги пользователя подставляются."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.author, self.tags[:1],
+                                    self.ingredients[:2])
+        self.path = f'/api/recipes/{self.recipe.id}/'
+
+    def get(self, client=None):
+        response = (client or self.client).get(self.path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_flags_are_per_user(self):
+        self.user.favourites.create(recipe=self.recipe)
+        self.assertTrue(self.get()['is_favorited'])
+        other = APIClient()
+        other.force_authenticate(self.author)
+        with self.assertNumQueries(4):
+            recipe = self.get(other)
+        self.assertFalse(recipe['is_favorited'])
+        with self.assertNumQueries(1):
+            self.assertTrue(self.get()['is_favorited'])
+
+    def changed(self, instance, **fields):
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        return self.get()
+
+    def test_invalidated_by_dependencies(self):
+        self.get()
+        self.assertEqual(self.changed(self.recipe, name='Суп')['name'], 'Суп')
+        self.assertEqual(self.changed(
+            self.author, first_name='Автор')['author']['first_name'], 'Автор')
+        self.assertEqual(
+            self.changed(self.ingredients[0], name='Мука')['ingredients'][0]
+            ['name'], 'Мука')
+        row = self.recipe.ingredients.get(ingredient=self.ingredients[1])
+        self.assertEqual(
+            self.changed(row, amount=3)['ingredients'][1]['amount'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.add(self.tags[2])
+        self.assertEqual(len(self.get()['tags']), 2)
@@ -0,0 +1,58 @@
+from recipes.relations import favourites, relation_state
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class RelationStateTest(APITestCase):
+    """Id избранного, покупок и подписок берутся из кэша по версиям."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [
+            create_recipe(self.author, self.tags[:1], self.ingredients[:2])
+            for _ in range(3)]
+        self.user.favourites.create(recipe=self.recipes[0])
+        self.user.shopping_list.create(recipe=self.recipes[1])
+        self.user.follower.create(author=self.author)
+
+    def test_cached_until_changed(self):
+        with self.assertNumQueries(3):
+            state = relation_state(self.user)
+        self.assertEqual(state, (
+            {self.recipes[0].id}, {self.recipes[1].id}, {self.author.id}))
+        with self.assertNumQueries(0):
+            self.assertEqual(relation_state(self.user), state)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.favourites.create(recipe=self.recipes[2])
+        with self.assertNumQueries(1):
+            state = relation_state(self.user)
+        self.assertEqual(state.favourites,
+                         {self.recipes[0].id, self.recipes[2].id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.follower.all().delete()
+            favourites.remove(self.user, [self.recipes[0].id])
+        with self.assertNumQueries(2):
+            state = relation_state(self.user)
+        self.assertEqual(state, (
+            {self.recipes[2].id}, {self.recipes[1].id}, set()))
+
+    def test_users_are_separate(self):
+        other = create_user('other')
+        relation_state(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.favourites.create(recipe=self.recipes[1])
+        with self.assertNumQueries(0):
+            self.assertEqual(relation_state(self.user).favourites,
+                             {self.recipes[0].id})
+        self.assertEqual(relation_state(other).favourites,
+                         {self.recipes[1].id})
+
+    def test_recipe_flags(self):
+        path = f'/api/recipes/{self.recipes[0].id}/'
+        self.assertTrue(self.client.get(path).json()['is_favorited'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'{path}favorite/')
+        recipe = self.client.get(path).json()
+        self.assertEqual(
+            (recipe['is_favorited'], recipe['is_in_shopping_cart'],
+             recipe['author']['is_subscribed']), (False, False, True))
@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.test import override_settings
+from recipes.search import RecipeSearchIndex
+
+from .utils import APITestCase, create_recipe
+
+
+class RecipeSearchTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title = create_recipe(
+                self.author, self.tags[:1], self.ingredients[:1],
+                name='Тыквенный суп')
+            self.other = create_recipe(
+                self.author, self.tags[:1], self.ingredients[:1],
+                name='Суп')
+            self.other.text = 'Тыквенный вкус'
+            self.other.save()
+
+    def search(self, query, **params):
+        return [recipe['id'] for recipe in self.client.get(
+            '/api/recipes/', {'search': query, **params}).json()['results']]
+
+    def test_ranked_by_field_weight(self):
+        self.assertEqual(self.search('тыквенный'),
+                         [self.title.id, self.other.id])
+
+    def test_cursor_pagination_keeps_rank(self):
+        self.assertEqual(self.search('тыквенный', pagination='cursor'),
+                         [self.title.id, self.other.id])
+
+    def test_saved_recipe_updates_index_without_rebuild(self):
+        self.search('тыквенный')
+        with mock.patch.object(RecipeSearchIndex, '_build') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.title.name = 'Гороховый суп'
+                self.title.save()
+            self.assertEqual(self.search('тыквенный'), [self.other.id])
+            self.assertEqual(self.search('гороховый'), [self.title.id])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.other.delete()
+            self.assertEqual(self.search('тыквенный'), [])
+        build.assert_not_called()
+
+    @override_settings(SEARCH_IDS_LIMIT=1)
+    def test_candidates_are_capped(self):
+        self.assertEqual(self.search('суп'), [self.other.id])
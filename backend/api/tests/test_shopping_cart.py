@@ -0,0 +1,87 @@
+import os
+import tempfile
+from unittest import mock
+
+from api import shopping_cart
+from django.test import override_settings
+from recipes.relations import shopping_list
+
+from .utils import APITestCase, create_recipe
+
+
+class ShoppingCartPDFCacheTest(APITestCase):
+    """PDF списка покупок собирается один раз для одних и тех же итогов."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(
+            SHOPPING_CART_PDF_CACHE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.recipes = [
+            create_recipe(self.author, self.tags[:1],
+                          self.ingredients[number:number + 2])
+            for number in range(3)]
+        shopping_list.add(self.user, [self.recipes[0].id])
+
+    def download(self):
+        with mock.patch.object(shopping_cart, 'render_pdf',
+                               wraps=shopping_cart.render_pdf) as render:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/?format=pdf')
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(response)
+        return content, render.call_count
+
+    def files(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith('.pdf'))
+
+    def test_reused_until_totals_change(self):
+        first, rendered = self.download()
+        self.assertTrue(first.startswith(b'%PDF'))
+        self.assertEqual(rendered, 1)
+        self.assertEqual(self.download(), (first, 0))
+        self.assertEqual(len(self.files()), 1)
+        shopping_list.add(self.user, [self.recipes[1].id])
+        second, rendered = self.download()
+        self.assertEqual(rendered, 1)
+        self.assertNotEqual(second, first)
+        self.assertEqual(len(self.files()), 2)
+        shopping_list.remove(self.user, [self.recipes[1].id])
+        self.assertEqual(self.download(), (first, 0))
+
+    def test_ingredient_rename_renders_again(self):
+        self.download()
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Мука'
+        ingredient.save()
+        self.assertEqual(self.download()[1], 1)
+        self.assertEqual(len(self.files()), 2)
+
+    def test_least_recently_read_are_evicted(self):
+        self.download()
+        first = self.files()[0]
+        for recipe in self.recipes[1:]:
+            shopping_list.add(self.user, [recipe.id])
+            self.download()
+        names = [first] + [name for name in self.files() if name != first]
+        for age, name in enumerate(names):
+            os.utime(os.path.join(self.directory, name), (age, age))
+        shopping_list.remove(
+            self.user, [recipe.id for recipe in self.recipes[1:]])
+        # Чтение из кэша делает самый старый документ самым свежим
+        self.assertEqual(self.download()[1], 0)
+        shopping_cart.evict_pdfs(max(
+            os.path.getsize(os.path.join(self.directory, name))
+            for name in names))
+        self.assertEqual(self.files(), [first])
+
+    @override_settings(SHOPPING_CART_PDF_CACHE_SIZE=0)
+    def test_cache_disabled(self):
+        self.assertEqual(self.download()[1], 1)
+        self.assertEqual(self.download()[1], 1)
+        self.assertEqual(self.files(), [])
@@ -0,0 +1,67 @@
+from unittest import mock
+
+from django.test import override_settings
+from recipes.similarity import RecipeSimilarityIndex
+
+from .utils import APITestCase, create_recipe
+
+
+class SimilarRecipesTest(APITestCase):
+    """Похожие рецепты по общим ингредиентам и тегам."""
+
+    def setUp(self):
+        super().setUp()
+        ingredients, tags = self.ingredients, self.tags
+        self.recipe = create_recipe(self.author, tags[:1], ingredients[:3])
+        self.close = create_recipe(self.author, tags[:1], ingredients[:3])
+        self.far = create_recipe(self.author, tags[1:2],
+                                 ingredients[:1] + ingredients[5:7])
+        self.other = create_recipe(self.author, tags[2:], ingredients[7:])
+
+    def similar(self, recipe=None, query=''):
+        response = self.client.get(
+            f'/api/recipes/{(recipe or self.recipe).id}/similar/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()]
+
+    def test_ranked_by_overlap(self):
+        self.assertEqual(self.similar(), [self.close.id, self.far.id])
+        self.assertEqual(self.similar(query='?limit=1'), [self.close.id])
+        self.assertEqual(self.similar(self.other), [])
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(
+            self.client.get(
+                f'/api/recipes/{self.close.id}/similar/').json()[0],
+            response.json())
+
+    @override_settings(SIMILAR_RECIPES_MAX_LIMIT=1)
+    def test_limit_is_capped(self):
+        self.assertEqual(self.similar(query='?limit=10'), [self.close.id])
+
+    def test_changes_are_applied_over_index(self):
+        self.similar()
+        with mock.patch.object(RecipeSimilarityIndex, '_build',
+                               wraps=RecipeSimilarityIndex._build) as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                twin = create_recipe(self.author, self.tags[:1],
+                                     self.ingredients[:3])
+            # У рецептов с одинаковым составом сходство одинаковое
+            similar = self.similar()
+            self.assertEqual(set(similar[:2]), {twin.id, self.close.id})
+            self.assertEqual(similar[2:], [self.far.id])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.close.delete()
+                self.far.tags.set(self.tags[:1])
+            self.assertEqual(self.similar(), [twin.id, self.far.id])
+            self.assertEqual(set(self.similar(self.far)),
+                             {self.recipe.id, twin.id})
+        self.assertEqual(build.call_count, 0)
+
+    def test_catalog_change_rebuilds_index(self):
+        self.similar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredients[9].delete()
+        with mock.patch.object(RecipeSimilarityIndex, '_build',
+                               wraps=RecipeSimilarityIndex._build) as build:
+            self.assertEqual(self.similar(), [self.close.id, self.far.id])
+        self.assertEqual(build.call_count, 1)
@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class SubscriptionsTest(APITestCase):
+    """Подписки текущего пользователя с ограничением числа рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.other = create_user('other')
+        self.stranger = create_user('stranger')
+        self.recipes = {
+            author: [create_recipe(author, self.tags[:1],
+                                   self.ingredients[:2])
+                     for _ in range(count)]
+            for author, count in ((self.author, 5), (self.other, 2),
+                                  (self.stranger, 1))}
+        for author in (self.author, self.other):
+            self.user.follower.create(author=author)
+        self.stranger.follower.create(author=self.author)
+
+    def subscriptions(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/users/subscriptions/{query}')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_only_own_subscriptions(self):
+        _, data = self.subscriptions()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(
+            [(row['id'], row['is_subscribed'], row['recipes_count'],
+              len(row['recipes'])) for row in data['results']],
+            [(self.author.id, True, 5, 5), (self.other.id, True, 2, 2)])
+
+    def test_recipes_limit(self):
+        _, data = self.subscriptions('?recipes_limit=3')
+        self.assertEqual(
+            [[recipe['id'] for recipe in row['recipes']]
+             for row in data['results']],
+            [[recipe.id for recipe in self.recipes[self.author][:-4:-1]],
+             [recipe.id for recipe in self.recipes[self.other][::-1]]])
+        self.assertEqual(
+            [row['recipes_count'] for row in data['results']], [5, 2])
+        _, data = self.subscriptions('?recipes_limit=x')
+        self.assertEqual(
+            [len(row['recipes']) for row in data['results']], [5, 2])
+
+    def test_queries_do_not_grow_with_page(self):
+        few, _ = self.subscriptions('?recipes_limit=2')
+        for number in range(4):
+            author = create_user(f'author-{number}')
+            create_recipe(author, self.tags[:1], self.ingredients[:2])
+            self.user.follower.create(author=author)
+        many, data = self.subscriptions('?recipes_limit=2')
+        self.assertEqual(data['count'], 6)
+        self.assertEqual(few, many)
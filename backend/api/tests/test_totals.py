@@ -0,0 +1,84 @@
+from django.db import IntegrityError
+from recipes.models import Recipe, RecipeIngredient, ShoppingList
+from recipes.totals import change_totals, live_totals, stored_totals
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class ShoppingListTotalsTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first = create_recipe(
+            self.author, self.tags[:1], self.ingredients[:2])
+        self.second = create_recipe(
+            self.author, self.tags[:1], self.ingredients[1:3])
+        for recipe in (self.first, self.second):
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+
+    def totals(self):
+        stored = stored_totals()
+        self.assertEqual(stored, live_totals())
+        return {ingredient_id: amount
+                for (user_id, ingredient_id), amount in stored.items()
+                if user_id == self.user.id}
+
+    def test_cart_changes(self):
+        ingredients = [ingredient.id for ingredient in self.ingredients[:3]]
+        self.assertEqual(self.totals(), dict(zip(ingredients, (10, 20, 10))))
+        ShoppingList.objects.get(user=self.user, recipe=self.first).delete()
+        self.assertEqual(self.totals(), dict(zip(ingredients[1:], (10, 10))))
+        self.second.delete()
+        self.assertEqual(self.totals(), {})
+
+    def test_recipe_update(self):
+        self.client.force_authenticate(self.author)
+        ShoppingList.objects.create(user=self.author, recipe=self.first)
+        response = self.client.patch(f'/api/recipes/{self.first.id}/', {
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 3},
+                            {'id': self.ingredients[5].id, 'amount': 7}],
+            'tags': [self.tags[0].id], 'name': 'Рецепт', 'text': 'Текст',
+            'cooking_time': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), {
+            self.ingredients[0].id: 3, self.ingredients[1].id: 10,
+            self.ingredients[2].id: 10, self.ingredients[5].id: 7})
+
+    def test_admin_inline(self):
+        admin = create_user('admin')
+        admin.is_staff = admin.is_superuser = True
+        admin.save()
+        Recipe.objects.filter(id=self.first.id).update(image='recipe/a.png')
+        rows = list(RecipeIngredient.objects.filter(
+            recipe=self.first).order_by('id'))
+        prefix = 'ingredients'
+        data = {
+            'author': self.author.id, 'name': 'Рецепт', 'text': 'Текст',
+            'cooking_time': 5, 'tags': [self.tags[0].id],
+            f'{prefix}-TOTAL_FORMS': 3, f'{prefix}-INITIAL_FORMS': 2,
+            f'{prefix}-MIN_NUM_FORMS': 0, f'{prefix}-MAX_NUM_FORMS': 1000,
+            f'{prefix}-0-id': rows[0].id, f'{prefix}-0-recipe': self.first.id,
+            f'{prefix}-0-ingredient': rows[0].ingredient_id,
+            f'{prefix}-0-amount': 4,
+            f'{prefix}-1-id': rows[1].id, f'{prefix}-1-recipe': self.first.id,
+            f'{prefix}-1-ingredient': rows[1].ingredient_id,
+            f'{prefix}-1-amount': 10, f'{prefix}-1-DELETE': 'on',
+            f'{prefix}-2-recipe': self.first.id,
+            f'{prefix}-2-ingredient': self.ingredients[7].id,
+            f'{prefix}-2-amount': 2,
+        }
+        self.client.force_login(admin)
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.first.id}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals(), {
+            self.ingredients[0].id: 4, self.ingredients[1].id: 10,
+            self.ingredients[2].id: 10, self.ingredients[7].id: 2})
+
+    def test_drift_is_not_hidden(self):
+        with self.assertRaises(IntegrityError):
+            change_totals([self.user.id], {self.ingredients[0].id: -11})
+        other = create_user('other')
+        with self.assertRaises(IntegrityError):
+            change_totals([other.id], {self.ingredients[0].id: -1})
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.test import APIClient
+from users.models import User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='password', first_name=username, last_name=username)
+
+
+def create_recipe(author, tags, ingredients, name='Рецепт'):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10)
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients)
+    return recipe
+
+
+class APITestCase(TestCase):
+    """Пользователи, теги и ингредиенты для тестов API.
+
+    Кэш очищается перед каждым тестом: записи хранятся по версиям и id,
+    а id объектов в разных тестах повторяются.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.author = create_user('author')
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}',
+                               color=f'#00000{number}')
+            for number in range(3)]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(10))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
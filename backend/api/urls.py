@@ -1,9 +1,10 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (Favourites, IngredientViewSet, RecipeViewSet,
-                    Shopping_listViews, Subscribe, SubscriptionsViews,
-                    TagViewSet)
+from .views import (BulkFavourites, BulkShoppingList, BulkSubscribe,
+                    DatabasePoolStatsView, Favourites, IngredientViewSet,
+                    RecipeViewSet, RequestStatsView, Shopping_listViews,
+                    Subscribe, SubscriptionsViews, TagViewSet)
 
 
 app_name = 'api'
@@ -16,6 +17,15 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 
 
 urlpatterns = [
+    # Раньше роутера, иначе путь совпадёт с адресом рецепта
+    path(
+        'recipes/shopping_cart/',
+        BulkShoppingList.as_view(),
+        name='shopping_cart_bulk'),
+    path(
+        'recipes/favorite/',
+        BulkFavourites.as_view(),
+        name='favourites_bulk'),
     path('', include(router.urls)),
     path(
         'recipes/<int:recipe_id>/shopping_cart/',
@@ -29,10 +39,22 @@ urlpatterns = [
         'users/<int:user_id>/subscribe/',
         Subscribe.as_view(),
         name='subscribe'),
+    path(
+        'users/subscribe/',
+        BulkSubscribe.as_view(),
+        name='subscribe_bulk'),
     path(
         'users/subscriptions/',
         SubscriptionsViews.as_view(),
         name='subscriptions'),
+    path(
+        'metrics/requests/',
+        RequestStatsView.as_view(),
+        name='request_stats'),
+    path(
+        'metrics/db-pool/',
+        DatabasePoolStatsView.as_view(),
+        name='db_pool_stats'),
 
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
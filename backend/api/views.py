@@ -1,24 +1,41 @@
-from django.db.models.aggregates import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import Prefetch
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import Ingredient, RecipeIngredient, Recipe, Tag
+from foodgram.db.pool import pool_stats
+from recipes.autocomplete import ingredient_index
+from recipes.feed import timeline
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.relations import favourites, follows, shopping_list
+from recipes.similarity import recipe_similarity_index
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.permissions import (SAFE_METHODS, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Follow, User
 
+from . import shopping_cart
+from .caching import (VersionedCacheMixin, recipe_queryset,
+                      recipe_representations)
+from .middleware import route_stats
+from .negotiation import FallbackContentNegotiation
 from .permissions import IsAdminOrReadOnly, IsAuthororAdminorRead
-from .serializers import (CreateUpdateRecipeSerializer, FavouriteSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscribeSerializer,
-                          TagSerializer)
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .serializers import (BulkIdsSerializer, CreateUpdateRecipeSerializer,
+                          FavouriteSerializer, IngredientSerializer,
+                          RecipeSerializer, ShoppingCartSerializer,
+                          SubscribeSerializer, TagSerializer,
+                          get_recipes_limit, request_relations)
 from .filters import IngredientFilter, RecipeFilter
+from .pagination import FeedCursorPagination, RecipeCursorPagination
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(VersionedCacheMixin, viewsets.ModelViewSet):
     """Вьюсет для Тегов."""
 
     queryset = Tag.objects.all()
@@ -27,7 +44,7 @@ class TagViewSet(viewsets.ModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, viewsets.ModelViewSet):
     """Вьюсет для Ингредиентов."""
 
     queryset = Ingredient.objects.all()
@@ -37,6 +54,15 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, ]
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по названию обслуживается индексом без запросов к БД."""
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_serializer(
+            ingredient_index.search(name), many=True)
+        return Response(serializer.data)
+
 
 class Favourites(generics.RetrieveDestroyAPIView, generics.ListCreateAPIView):
     """Вью для добавления и удаления рецепта в избранное."""
@@ -52,7 +78,12 @@ class Favourites(generics.RetrieveDestroyAPIView, generics.ListCreateAPIView):
     def create(self, request, *args, **kwargs):
         """Добавление в избранное."""
         recipe = self.get_object()
-        favorite = request.user.favourites.create(recipe=recipe)
+        try:
+            with transaction.atomic():
+                favorite = request.user.favourites.create(recipe=recipe)
+        except IntegrityError:
+            return Response('Рецепт уже в избранном!',
+                            status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(favorite)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -71,6 +102,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = PageNumberPagination
     permission_classes = (IsAuthororAdminorRead, )
 
+    @property
+    def paginator(self):
+        """Курсорная пагинация включается параметром ?pagination=cursor.
+
+        Курсор идёт по id рецепта, поэтому результаты поиска, упорядоченные
+        по релевантности, всегда выводятся по номерам страниц.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if (params.get('pagination') == 'cursor'
+                    and not params.get('search')):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'similar'):
+            return Recipe.objects.only('id', 'author_id')
+        return recipe_queryset()
+
+    def list(self, request, *args, **kwargs):
+        """Страница id рецептов, сами рецепты берутся из кэша."""
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(recipe_representations(
+            request, ((recipe.id, recipe.author_id) for recipe in page)))
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        representations = recipe_representations(
+            request, [(recipe.id, recipe.author_id)])
+        if not representations:
+            raise Http404
+        return Response(representations[0])
+
     def get_serializer_class(self):
         """Переопределение сериализатора для POST запроса."""
         if self.request.method in SAFE_METHODS:
@@ -81,22 +148,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Добавление автора рецепта, пользователя который сделал запрос."""
         serializer.save(author=self.request.user)
 
-    @action(detail=False)
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Рецепты авторов из подписок пользователя, новые первыми."""
+        paginator = FeedCursorPagination()
+        entries = paginator.paginate_queryset(
+            timeline(request.user, request_relations(request).follows),
+            request, view=self)
+        return paginator.get_paginated_response(
+            recipe_representations(request, entries))
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Рецепты с теми же ингредиентами и тегами, похожие первыми."""
+        recipe = self.get_object()
+        limit = request.query_params.get('limit', '')
+        if limit.isdigit():
+            limit = min(int(limit), settings.SIMILAR_RECIPES_MAX_LIMIT)
+        else:
+            limit = settings.SIMILAR_RECIPES_LIMIT
+        recipe_ids = recipe_similarity_index.similar(recipe.id, limit)
+        authors = dict(Recipe.objects.filter(id__in=recipe_ids)
+                       .values_list('id', 'author_id'))
+        return Response(recipe_representations(request, (
+            (pk, authors[pk]) for pk in recipe_ids if pk in authors)))
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            renderer_classes=(PlainTextRenderer, CSVRenderer, PDFRenderer),
+            content_negotiation_class=FallbackContentNegotiation)
     def download_shopping_cart(self, request):
-        ingredients = (RecipeIngredient.objects.filter(
-            recipe__shopping_list__user=request.user).values(
-            'ingredient__name',
-            'ingredient__measurement_unit',).annotate(
-            amount=Sum('amount')).order_by()
-        )
-        data = []
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['amount']
-            data.append(f'{name}: {amount}, {measurement_unit}\n')
-        response = HttpResponse(content=data, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename="cart.txt"'
+        """Выгрузка списка покупок в формате txt, csv или pdf."""
+        file_format = request.accepted_renderer.format
+        filename = f'cart.{file_format}'
+        if file_format == 'pdf':
+            return FileResponse(shopping_cart.cart_pdf(request.user),
+                                as_attachment=True, filename=filename,
+                                content_type='application/pdf')
+        ingredients = shopping_cart.cart_ingredients(request.user)
+        render = getattr(shopping_cart, f'render_{file_format}')
+        response = StreamingHttpResponse(
+            render(ingredients),
+            content_type=f'{request.accepted_renderer.media_type}; '
+                         'charset=utf-8')
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"')
         return response
 
 
@@ -146,30 +241,101 @@ class Shopping_listViews(generics.RetrieveDestroyAPIView,
         """Получение id рецепта из URL."""
         return get_object_or_404(Recipe, id=self.kwargs['recipe_id'])
 
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         """Добавление в список покупок."""
         recipe = self.get_object()
-        request.user.shopping_list.create(recipe=recipe)
+        try:
+            with transaction.atomic():
+                request.user.shopping_list.create(recipe=recipe)
+        except IntegrityError:
+            return Response('Рецепт уже в списке покупок!',
+                            status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def perform_destroy(self, instance):
         """Удаление рецепта из листа покупок."""
         self.request.user.shopping_list.filter(
             recipe=self.get_object()).delete()
 
 
+class BulkRelationView(APIView):
+    """Массовое добавление (POST) и удаление (DELETE) по списку id."""
+
+    permission_classes = (IsAuthenticated,)
+    relation = None
+
+    def post(self, request):
+        return self._apply(request, self.relation.add)
+
+    def delete(self, request):
+        return self._apply(request, self.relation.remove)
+
+    @staticmethod
+    def _apply(request, method):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = method(request.user, serializer.validated_data['ids'])
+        return Response({'results': [
+            {'id': pk, 'status': result} for pk, result in results.items()
+        ]})
+
+
+class BulkFavourites(BulkRelationView):
+    """Массовое добавление и удаление рецептов в избранном."""
+
+    relation = favourites
+
+
+class BulkShoppingList(BulkRelationView):
+    """Массовое добавление и удаление рецептов в списке покупок."""
+
+    relation = shopping_list
+
+
+class BulkSubscribe(BulkRelationView):
+    """Массовая подписка и отписка от авторов."""
+
+    relation = follows
+
+
 class SubscriptionsViews(generics.ListAPIView):
     """Вьюсет для отображения подписок пользователя."""
 
-    queryset = Follow.objects.all()
     serializer_class = SubscribeSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = PageNumberPagination
 
-    @action(detail=False, methods=['GET'])
-    def subscriptions(self, request):
-        """Метод для отображения всех подписок пользователя."""
-        follows = request.user.follower
-        serializer = SubscribeSerializer(follows, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        """Подписки с числом рецептов и не более recipes_limit рецептов."""
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        return (
+            self.request.user.follower
+            .select_related('author')
+            .order_by('author', 'id')
+            .prefetch_related(Prefetch('author__recipe', queryset=recipes,
+                                       to_attr='limited_recipes'))
+        )
+
+
+class RequestStatsView(APIView):
+    """Перцентили времени ответа по маршрутам в текущем процессе, мс."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(route_stats.summary())
+
+
+class DatabasePoolStatsView(APIView):
+    """Метрики пулов соединений с БД в текущем процессе."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(pool_stats())
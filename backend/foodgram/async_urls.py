@@ -0,0 +1,8 @@
+from django.urls import include, path
+
+from . import urls
+
+urlpatterns = [
+    path('api/', include('api.async_urls')),
+    *urls.urlpatterns,
+]
@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing, suppress
+
+from django.db import OperationalError
+
+DEFAULTS = {
+    'MIN_SIZE': 0,
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 30 * 60,
+    'MAX_IDLE': 5 * 60,
+    'CHECK_IDLE': 5,
+}
+
+
+class _Entry:
+    __slots__ = ('connection', 'created', 'released')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.released = time.monotonic()
+
+
+class ConnectionPool:
+    """Пул соединений DB-API одной базы в пределах процесса.
+
+    Свободные соединения выдаются начиная с последнего возвращённого,
+    поэтому лишние простаивают и закрываются по MAX_IDLE, но не меньше
+    MIN_SIZE. Соединение старше MAX_LIFETIME закрывается при возврате,
+    а простоявшее дольше CHECK_IDLE секунд проверяется перед выдачей.
+    """
+
+    def __init__(self, min_size, max_size, timeout, max_lifetime, max_idle,
+                 check_idle, database=None):
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._opening = 0
+        self.waiting = 0
+        self.created = 0
+        self.closed = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.check_failures = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def acquire(self, connect, check):
+        """Свободное исправное соединение или новое от connect()."""
+        started = time.monotonic()
+        while True:
+            entry = self._reserve(started)
+            if entry is None:
+                entry = self._open(connect)
+            elif not self._usable(entry, check):
+                self._close(entry)
+                continue
+            break
+        waited = time.monotonic() - started
+        with self._condition:
+            self.acquired += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+        return entry.connection
+
+    def _reserve(self, started):
+        with self._condition:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    self._in_use[id(entry.connection)] = entry
+                    return entry
+                if self._size() < self.max_size:
+                    self._opening += 1
+                    return None
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise OperationalError(
+                        f'Нет свободных соединений с БД за {self.timeout} с, '
+                        f'занято {len(self._in_use)} из {self.max_size}.')
+                self.waiting += 1
+                self._condition.wait(remaining)
+                self.waiting -= 1
+
+    def _open(self, connect):
+        try:
+            entry = _Entry(connect())
+        except BaseException:
+            with self._condition:
+                self._opening -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._opening -= 1
+            self.created += 1
+            self._in_use[id(entry.connection)] = entry
+        return entry
+
+    def _usable(self, entry, check):
+        now = time.monotonic()
+        if now - entry.created > self.max_lifetime:
+            return False
+        if now - entry.released < self.check_idle:
+            return True
+        try:
+            check(entry.connection)
+        except Exception:
+            with self._condition:
+                self.check_failures += 1
+            return False
+        return True
+
+    def release(self, connection, reset):
+        """Возврат соединения после reset(); при ошибке оно закрывается."""
+        with self._condition:
+            entry = self._in_use.get(id(connection))
+        if entry is None:
+            connection.close()
+            return
+        try:
+            reset(connection)
+        except Exception:
+            self._close(entry)
+            return
+        now = time.monotonic()
+        if now - entry.created > self.max_lifetime:
+            self._close(entry)
+            return
+        entry.released = now
+        expired = []
+        with self._condition:
+            del self._in_use[id(connection)]
+            self._idle.append(entry)
+            while (len(self._idle) > self.min_size
+                   and now - self._idle[0].released > self.max_idle):
+                expired.append(self._idle.popleft())
+            self._condition.notify()
+        for entry in expired:
+            self._close(entry, in_use=False)
+
+    def discard(self, connection):
+        """Закрытие выданного соединения без возврата в пул."""
+        with self._condition:
+            entry = self._in_use.get(id(connection))
+        if entry is None:
+            connection.close()
+        else:
+            self._close(entry)
+
+    def _close(self, entry, in_use=True):
+        with self._condition:
+            if in_use:
+                self._in_use.pop(id(entry.connection), None)
+            self.closed += 1
+            self._condition.notify()
+        with suppress(Exception):
+            entry.connection.close()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'database': self.database,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size(),
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self.waiting,
+                'created': self.created,
+                'closed': self.closed,
+                'acquired': self.acquired,
+                'timeouts': self.timeouts,
+                'check_failures': self.check_failures,
+                'wait_ms_total': round(self.wait_time * 1000, 3),
+                'wait_ms_avg': round(
+                    self.wait_time * 1000 / self.acquired, 3
+                ) if self.acquired else 0,
+                'wait_ms_max': round(self.max_wait * 1000, 3),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Соединения родителя нельзя использовать в дочернем процессе
+os.register_at_fork(after_in_child=_pools.clear)
+
+
+def get_pool(alias, conn_params, options, database=None):
+    """Пул для алиаса и параметров подключения.
+
+    Обёртка с тем же алиасом может подключаться к другой базе: тестовой,
+    служебной в _nodb_cursor или после смены NAME, поэтому соединения
+    разных параметров в одном пуле не смешиваются.
+    """
+    key = (alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(database=database, **{
+                name.lower(): value
+                for name, value in {**DEFAULTS, **options}.items()})
+        return _pools[key]
+
+
+def pool_stats():
+    """Метрики пулов соединений текущего процесса по алиасам БД.
+
+    У алиаса по пулу на каждый набор параметров подключения.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    stats = {}
+    for (alias, _), pool in sorted(pools, key=lambda item: item[0]):
+        stats.setdefault(alias, []).append(pool.stats())
+    return stats
+
+
+class PooledDatabaseWrapperMixin:
+    """Соединения бэкенда берутся из пула и возвращаются в него.
+
+    Django закрывает соединение в конце запроса при CONN_MAX_AGE = 0,
+    вместо закрытия оно откатывает незавершённую транзакцию, сбрасывает
+    состояние сеанса и остаётся в пуле. Настройки пула задаются в ключе
+    POOL настроек базы.
+    """
+
+    _pool = None
+
+    def get_new_connection(self, conn_params):
+        self._pool = get_pool(
+            self.alias, conn_params, self.settings_dict.get('POOL', {}),
+            self.settings_dict['NAME'])
+        return self._pool.acquire(
+            lambda: super(PooledDatabaseWrapperMixin, self)
+            .get_new_connection(conn_params),
+            self._check_connection)
+
+    @staticmethod
+    def _check_connection(connection):
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('SELECT 1')
+        connection.rollback()
+
+    def _reset_connection(self, connection):
+        """Подготовка соединения к следующему владельцу.
+
+        Исключение означает, что соединение нельзя вернуть в пул.
+        """
+        if getattr(connection, 'closed', False):
+            raise OperationalError('Соединение закрыто.')
+        connection.rollback()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Обёртка продолжит ссылаться на соединение, отдавать
+                # его другому потоку нельзя
+                self._pool.discard(self.connection)
+            else:
+                self._pool.release(self.connection, self._reset_connection)
@@ -0,0 +1,18 @@
+from contextlib import closing
+
+from django.db.backends.postgresql import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений в процессе."""
+
+    def _reset_connection(self, connection):
+        super()._reset_connection(connection)
+        # Временные таблицы, SET, подготовленные запросы и блокировки
+        # сеанса не должны достаться следующему владельцу; DISCARD ALL
+        # нельзя выполнить внутри транзакции
+        connection.autocommit = True
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('DISCARD ALL')
@@ -0,0 +1,19 @@
+from contextlib import closing
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite с тем же пулом, для проверки пула без PostgreSQL."""
+
+    def _reset_connection(self, connection):
+        super()._reset_connection(connection)
+        # Сбросить сеанс SQLite одной командой нельзя, соединение
+        # с временными таблицами закрывается
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('SELECT 1 FROM temp.sqlite_master LIMIT 1')
+            if cursor.fetchone() is not None:
+                raise OperationalError('В сеансе есть временные таблицы.')
@@ -39,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
+    'api.middleware.AsyncReadMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +51,9 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
+# Адреса с async-вьюхами для чтения, используются только под ASGI;
+# пустое значение оставляет синхронные вьюхи
+ASYNC_READ_URLCONF = os.getenv('ASYNC_READ_URLCONF', 'foodgram.async_urls')
 
 TEMPLATES = [
     {
@@ -74,15 +79,45 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
         'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Соединения процесса переиспользуются через пул, поэтому
+        # CONN_MAX_AGE остаётся 0: в конце запроса соединение
+        # возвращается в пул. Воркеров gunicorn * MAX_SIZE не должно быть
+        # больше max_connections в PostgreSQL
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', 30 * 60)),
+            'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', 5 * 60)),
+            'CHECK_IDLE': float(os.getenv('DB_POOL_CHECK_IDLE', 5)),
+        },
     }
 }
 
+# Версии данных, по которым сбрасываются кэш ответов, индексы в памяти
+# процессов и закэшированные токены, должны быть общими для всех воркеров
+# и команд manage.py вроде loaddata, поэтому в docker-compose кэш в Redis.
+# LocMemCache виден только своему процессу и годится для runserver
+CACHE_BACKEND = os.getenv('CACHE_BACKEND',
+                          'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+if CACHE_BACKEND.endswith('.LocMemCache'):
+    # По умолчанию при 300 записях вытесняется треть кэша вместе с версиями
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+    }
+
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
@@ -90,7 +125,12 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
@@ -153,6 +193,69 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Максимальный размер загружаемого фото рецепта в байтах
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024))
+# Фото приходит в base64 внутри JSON, поэтому тело запроса больше на треть;
+# JSON больше этого размера отклоняется до разбора
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+# Размеры уменьшенных копий фото и число потоков для их создания;
+# при 0 потоков копии создаются сразу после сохранения рецепта
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+SHOPPING_CART_PDF_BOLD_FONT = os.getenv(
+    'SHOPPING_CART_PDF_BOLD_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf')
+# Собранные PDF хранятся под хэшем содержимого списка покупок; при
+# превышении размера в байтах удаляются давно не запрошенные, 0 отключает
+# кэш. Каталог не должен раздаваться как media
+SHOPPING_CART_PDF_CACHE_DIR = os.getenv(
+    'SHOPPING_CART_PDF_CACHE_DIR',
+    os.path.join(BASE_DIR, 'cache', 'shopping_cart'))
+SHOPPING_CART_PDF_CACHE_SIZE = int(
+    os.getenv('SHOPPING_CART_PDF_CACHE_SIZE', 100 * 1024 * 1024))
+
+# Пороги, после которых запрос попадает в лог как медленный,
+# и число последних запросов маршрута для расчёта перцентилей
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', 50))
+REQUEST_TIMING_WINDOW = int(os.getenv('REQUEST_TIMING_WINDOW', 1000))
+
+# С этого числа подписчиков рецепты автора не записываются в ленты
+# при создании, а подтягиваются при чтении ленты
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+# Команда resume_feed_fanout снова раскладывает рецепты автора по лентам,
+# только когда подписчиков стало меньше этого числа
+FEED_FANOUT_RESUME_LIMIT = int(
+    os.getenv('FEED_FANOUT_RESUME_LIMIT', FEED_FANOUT_LIMIT // 2))
+
+# Сколько лучших совпадений поиска по индексам в памяти попадает в SQL
+# фильтра: их id и порядок передаются в запрос целиком
+SEARCH_IDS_LIMIT = int(os.getenv('SEARCH_IDS_LIMIT', 1000))
+
+# Похожих рецептов в ответе по умолчанию и не больше чем по параметру
+# limit; вес общего тега относительно общего ингредиента
+SIMILAR_RECIPES_LIMIT = int(os.getenv('SIMILAR_RECIPES_LIMIT', 10))
+SIMILAR_RECIPES_MAX_LIMIT = int(os.getenv('SIMILAR_RECIPES_MAX_LIMIT', 50))
+SIMILAR_RECIPES_TAG_WEIGHT = float(
+    os.getenv('SIMILAR_RECIPES_TAG_WEIGHT', 0.5))
+
+# Наибольшее число id в одном запросе к массовым эндпоинтам
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', 100))
+
+# Токены в памяти процесса: сколько хранить и сколько секунд доверять
+# записи, изменённой в обход сигналов; общий кэш позволяет новым
+# процессам не ходить в БД за уже известными токенами
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'false').lower() == 'true'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,29 +1,49 @@
+from django.conf import settings
 from django.contrib import admin
+from django.db.models import Case, When
 
+from .autocomplete import ingredient_index
 from .models import (Favourites, Ingredient, RecipeIngredient, Recipe,
                      ShoppingList, Tag)
 from .forms import IngredientForm
+from .totals import change_recipe_in_totals, recipe_amounts
 
 
 class IngredientInRecipeInLime(admin.TabularInline):
     model = RecipeIngredient
     extra = 0
     formset = IngredientForm
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'name', 'image',
                     'text', 'cooking_time', 'get_followers_count')
     empty_value_display = '-пусто-'
-    search_fields = ('name', )
-    list_filter = ('author', )
-    empty_value_display = '-пусто-'
+    search_fields = ('name', '^author__username')
+    list_filter = ('tags', )
+    list_select_related = ('author', )
+    autocomplete_fields = ('author', 'tags')
+    show_full_result_count = False
     ordering = ['name']
     inlines = (IngredientInRecipeInLime, )
 
-    @admin.display(description='Добавили в избранное')
+    @admin.display(description='Добавили в избранное',
+                   ordering='favourites_count')
     def get_followers_count(self, obj):
-        return obj.favourites.count()
+        return obj.favourites_count
+
+    def save_formset(self, request, form, formset, change):
+        """Пересчёт итогов списков покупок после изменения ингредиентов."""
+        if formset.model is not RecipeIngredient:
+            return super().save_formset(request, form, formset, change)
+        old_amounts = recipe_amounts(form.instance.id)
+        super().save_formset(request, form, formset, change)
+        change_recipe_in_totals(form.instance.id, old_amounts,
+                                recipe_amounts(form.instance.id))
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -37,23 +57,37 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
     empty_value_display = '-пусто-'
     ordering = ['name']
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск, в том числе для автодополнения, по индексу в памяти."""
+        if not search_term:
+            return queryset, False
+        ids = [entry.id for entry in ingredient_index.search(search_term)[
+            :settings.SEARCH_IDS_LIMIT]]
+        return queryset.filter(id__in=ids).order_by(Case(
+            *(When(id=pk, then=position) for position, pk in enumerate(ids))
+        )), False
+
 
 class FavouritesAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user__email',)
-    list_filter = ('user',)
+    search_fields = ('^user__email', 'recipe__name')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     ordering = ['user']
 
 
 class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user__email',)
-    list_filter = ('user',)
+    search_fields = ('^user__email', 'recipe__name')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     ordering = ['user']
 
@@ -0,0 +1,87 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from .models import Ingredient
+from .versioning import get_version
+
+IngredientEntry = namedtuple('IngredientEntry',
+                             ('id', 'name', 'measurement_unit'))
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Строится лениво при первом поиске и перестраивается, когда меняется
+    версия модели Ingredient. Индекс, созданный из готовых строк,
+    к БД не обращается.
+    """
+
+    def __init__(self, rows=None):
+        self._lock = threading.Lock()
+        self._version = None
+        self._state = self._build(())
+        self._static = rows is not None
+        if self._static:
+            self._state = self._build(rows)
+
+    @staticmethod
+    def _build(rows):
+        entries = tuple(sorted(
+            (IngredientEntry(*row) for row in rows),
+            key=lambda entry: (entry.name.casefold(), entry.id),
+        ))
+        keys = tuple(entry.name.casefold() for entry in entries)
+        offsets, position = [], 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        return keys, entries, '\n'.join(keys), tuple(offsets)
+
+    def _ensure_fresh(self):
+        version = get_version(Ingredient)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            self._state = self._build(
+                Ingredient.objects.order_by().values_list(
+                    'id', 'name', 'measurement_unit'))
+            self._version = version
+
+    def search(self, query):
+        """Совпадения по началу названия, затем по подстроке."""
+        if not self._static:
+            self._ensure_fresh()
+        return self.lookup(query)
+
+    def lookup(self, query):
+        """Поиск по уже загруженным данным без обращения к БД."""
+        keys, entries, haystack, offsets = self._state
+        query = query.strip().casefold()
+        if not query:
+            return list(entries)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        return list(entries[start:end]) + [
+            entries[position]
+            for position in self._containing(query, haystack, offsets)
+            if position < start or position >= end
+        ]
+
+    @staticmethod
+    def _containing(query, haystack, offsets):
+        """Номера строк, содержащих подстроку, по общему буферу названий."""
+        found = haystack.find(query)
+        while found != -1:
+            position = bisect_right(offsets, found) - 1
+            yield position
+            if position + 1 == len(offsets):
+                return
+            found = haystack.find(query, offsets[position + 1])
+
+
+ingredient_index = IngredientIndex()
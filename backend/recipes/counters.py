@@ -0,0 +1,43 @@
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from users.models import User
+
+from .models import Recipe
+
+# Модель, поле счётчика и связь, по которой он считается
+COUNTERS = (
+    (Recipe, 'favourites_count', 'favourites'),
+    (User, 'recipes_count', 'recipe'),
+    (User, 'followers_count', 'following'),
+)
+
+
+def change_counter(model, field, pk, delta):
+    """Атомарное изменение счётчика в БД без чтения строки."""
+    change_counters(model, field, [pk], delta)
+
+
+def change_counters(model, field, pks, delta):
+    """Одинаковое изменение счётчика у нескольких строк одним запросом."""
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+
+def counter_drift():
+    """Строки, у которых сохранённый счётчик не совпадает с подсчётом."""
+    for model, field, relation in COUNTERS:
+        rows = (model.objects.annotate(actual=Count(relation))
+                .exclude(**{field: F('actual')})
+                .values_list('pk', field, 'actual'))
+        for pk, stored, actual in rows.iterator():
+            yield model, field, pk, stored, actual
+
+
+def repair_counters(drift):
+    """Запись подсчитанных значений в расходящиеся счётчики."""
+    repaired = 0
+    for model, field, pk, _, actual in drift:
+        model.objects.filter(pk=pk).update(**{field: actual})
+        repaired += 1
+    return repaired
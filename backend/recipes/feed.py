@@ -0,0 +1,214 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from users.models import Follow, User
+
+from .models import FeedEntry, Recipe
+from .versioning import bump_version, get_version
+
+BATCH_SIZE = 1000
+
+FeedItem = namedtuple('FeedItem', ('recipe_id', 'author_id'))
+
+
+def has_large_audience(followers_count):
+    """Рецепты таких авторов не раскладываются по лентам при создании."""
+    return followers_count >= settings.FEED_FANOUT_LIMIT
+
+
+def pulled_authors():
+    """id авторов, чьи рецепты подставляются в ленты при чтении."""
+    key = f'feed:pulled:{get_version(FeedEntry)}'
+    authors = cache.get(key)
+    if authors is None:
+        authors = frozenset(User.objects.filter(
+            feed_pulled=True).values_list('id', flat=True))
+        cache.set(key, authors, timeout=None)
+    return authors
+
+
+def _pulled_changed():
+    transaction.on_commit(lambda: bump_version(FeedEntry))
+
+
+def pull_authors(author_ids):
+    """Рецепты авторов дальше подставляются в ленты при чтении.
+
+    Уже записанные в ленты рецепты остаются, при чтении они сливаются
+    с остальными.
+    """
+    if author_ids and User.objects.filter(
+            id__in=author_ids, feed_pulled=False).update(feed_pulled=True):
+        _pulled_changed()
+
+
+def add_entries(user_ids, author_id, recipe_ids):
+    """Запись рецептов автора в ленты пользователей."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    entries = (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                         author_id=author_id)
+               for user_id in user_ids for recipe_id in recipe_ids)
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """Новый рецепт попадает в ленты подписчиков сразу при записи."""
+    followers_count, pulled = User.objects.filter(
+        id=recipe.author_id).values_list(
+            'followers_count', 'feed_pulled').first() or (0, False)
+    if pulled:
+        return
+    if has_large_audience(followers_count):
+        pull_authors([recipe.author_id])
+        return
+    add_entries(
+        Follow.objects.filter(author_id=recipe.author_id)
+        .values_list('user_id', flat=True).iterator(),
+        recipe.author_id, [recipe.id])
+
+
+def follow_added(follow):
+    follows_added(follow.user_id, [follow.author_id])
+
+
+def follow_removed(follow):
+    follows_removed(follow.user_id, [follow.author_id])
+
+
+def follows_added(user_id, author_ids):
+    """Рецепты новых авторов из подписок попадают в ленту пользователя."""
+    if not author_ids:
+        return
+    authors = User.objects.filter(id__in=author_ids, feed_pulled=False)
+    large, small = [], []
+    for author_id, followers_count in authors.values_list(
+            'id', 'followers_count'):
+        if has_large_audience(followers_count):
+            large.append(author_id)
+        else:
+            small.append(author_id)
+    pull_authors(large)
+    if not small:
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+         for recipe_id, author_id in Recipe.objects.filter(
+             author_id__in=small).values_list('id', 'author_id')),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def follows_removed(user_id, author_ids):
+    """Рецепты авторов убираются из ленты бывшего подписчика.
+
+    Автор, у которого стало меньше подписчиков, продолжает подставляться
+    при чтении, пока его не вернёт к записи resume_fan_out.
+    """
+    if author_ids:
+        FeedEntry.objects.filter(
+            user_id=user_id, author_id__in=author_ids).delete()
+
+
+def author_recipes(author_id):
+    return Recipe.objects.filter(author_id=author_id).values_list(
+        'id', flat=True)
+
+
+def resume_fan_out():
+    """Запись рецептов в ленты для авторов, у которых стало мало подписчиков.
+
+    Выполняется командой resume_feed_fanout вне запросов. Порог
+    FEED_FANOUT_RESUME_LIMIT ниже FEED_FANOUT_LIMIT, поэтому автор,
+    у которого число подписчиков колеблется у границы, не раскладывается
+    по лентам заново при каждом её пересечении.
+    """
+    resumed = 0
+    for author_id in list(User.objects.filter(
+            feed_pulled=True,
+            followers_count__lt=settings.FEED_FANOUT_RESUME_LIMIT,
+    ).values_list('id', flat=True)):
+        with transaction.atomic():
+            if not User.objects.filter(
+                    id=author_id, feed_pulled=True).update(feed_pulled=False):
+                continue
+            add_entries(
+                Follow.objects.filter(author_id=author_id)
+                .values_list('user_id', flat=True).iterator(),
+                author_id, author_recipes(author_id))
+            _pulled_changed()
+        resumed += 1
+    return resumed
+
+
+class Timeline:
+    """Лента пользователя для CursorPagination без записи при чтении.
+
+    Рецепты из FeedEntry и рецепты подставляемых авторов из подписок
+    выбираются по индексам в пределах страницы и сливаются по id рецепта.
+    Поддерживаются только order_by, filter по recipe_id и срез, которые
+    использует CursorPagination.
+    """
+
+    def __init__(self, user_id, author_ids, descending=True, bounds=None):
+        self.user_id = user_id
+        self.author_ids = author_ids
+        self.descending = descending
+        self.bounds = bounds or {}
+
+    def order_by(self, ordering):
+        return Timeline(self.user_id, self.author_ids,
+                        ordering.startswith('-'), self.bounds)
+
+    def filter(self, **lookups):
+        bounds = {**self.bounds}
+        for lookup, value in lookups.items():
+            field, operator = lookup.split('__')
+            if field != 'recipe_id' or operator not in ('lt', 'gt'):
+                raise ValueError(f'Неподдерживаемый фильтр {lookup}')
+            bounds[operator] = int(value)
+        return Timeline(self.user_id, self.author_ids, self.descending,
+                        bounds)
+
+    def _select(self, queryset, field, stop):
+        ordering = f'-{field}' if self.descending else field
+        return queryset.filter(**{
+            f'{field}__{operator}': value
+            for operator, value in self.bounds.items()
+        }).order_by(ordering).values_list(field, 'author_id')[:stop]
+
+    def __getitem__(self, page):
+        items = list(self._select(
+            FeedEntry.objects.filter(user_id=self.user_id),
+            'recipe_id', page.stop))
+        if self.author_ids:
+            items += self._select(
+                Recipe.objects.filter(author_id__in=self.author_ids),
+                'id', page.stop)
+        items = sorted(dict(items).items(), reverse=self.descending)
+        return [FeedItem(*item) for item in items][page]
+
+
+def timeline(user, following):
+    """Лента пользователя, following — id авторов из его подписок."""
+    return Timeline(user.id, sorted(pulled_authors() & following))
+
+
+def rebuild_feeds():
+    """Пересоздание лент после массовой загрузки данных."""
+    FeedEntry.objects.all().delete()
+    User.objects.filter(feed_pulled=True).update(feed_pulled=False)
+    large = []
+    for author_id in (Follow.objects.values_list('author_id', flat=True)
+                      .distinct().order_by()):
+        user_ids = list(Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True))
+        if has_large_audience(len(user_ids)):
+            large.append(author_id)
+        else:
+            add_entries(user_ids, author_id, author_recipes(author_id))
+    User.objects.filter(id__in=large).update(feed_pulled=True)
+    _pulled_changed()
@@ -0,0 +1,119 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .versioning import bump_version
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def variant_name(image_name, variant):
+    """Путь уменьшенной копии фото в хранилище."""
+    return f'recipe/{variant}/{PurePosixPath(image_name).name}.jpg'
+
+
+def variant_names(recipe):
+    """Пути уменьшенных копий, сохранённые в рецепте, по полям."""
+    return {
+        f'image_{variant}': getattr(recipe, f'image_{variant}').name or None
+        for variant in settings.RECIPE_IMAGE_VARIANTS
+    }
+
+
+def variants_outdated(recipe):
+    """Нужно ли заново создавать или убрать уменьшенные копии фото."""
+    return any(
+        name != (variant_name(recipe.image.name, field[len('image_'):])
+                 if recipe.image else None)
+        for field, name in variant_names(recipe).items()
+    )
+
+
+def delete_variants(names):
+    """Удаление файлов копий, на которые не ссылается ни один рецепт.
+
+    Одно фото может быть у многих рецептов, например в наборе данных
+    generate_dataset, а с ним и файлы копий.
+    """
+    for field, name in names.items():
+        if name and not Recipe.objects.filter(**{field: name}).exists():
+            default_storage.delete(name)
+
+
+def _save_variants(image_name):
+    with default_storage.open(image_name) as file, \
+            Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        names = {}
+        for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size)
+            buffer = BytesIO()
+            resized.save(buffer, 'JPEG', quality=85, optimize=True)
+            name = variant_name(image_name, variant)
+            default_storage.delete(name)
+            names[f'image_{variant}'] = default_storage.save(
+                name, ContentFile(buffer.getvalue()))
+    return names
+
+
+def build_variants(recipe_id, image_name):
+    """Копии фото рецепта вместо прежних, без фото копии убираются."""
+    try:
+        if image_name:
+            names = _save_variants(image_name)
+        else:
+            names = dict.fromkeys(
+                f'image_{variant}'
+                for variant in settings.RECIPE_IMAGE_VARIANTS)
+        recipes = Recipe.objects.filter(pk=recipe_id)
+        old_names = recipes.values(*names).first()
+        if image_name:
+            recipes = recipes.filter(image=image_name)
+        else:
+            recipes = recipes.filter(Q(image=None) | Q(image=''))
+        if recipes.update(**names):
+            bump_version(Recipe, recipe_id)
+            delete_variants({
+                field: name for field, name in old_names.items()
+                if name != names[field]})
+    except Exception:
+        logger.exception('Не удалось создать копии фото %s', image_name)
+
+
+def _build_variants_in_worker(recipe_id, image_name):
+    try:
+        build_variants(recipe_id, image_name)
+    finally:
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images')
+    return _executor
+
+
+def schedule_variants(recipe):
+    """Создание копий фото в фоне после фиксации транзакции."""
+    if settings.RECIPE_IMAGE_WORKERS > 0:
+        task = partial(_get_executor().submit, _build_variants_in_worker,
+                       recipe.pk, recipe.image.name or None)
+    else:
+        task = partial(build_variants, recipe.pk, recipe.image.name or None)
+    transaction.on_commit(task)
@@ -0,0 +1,323 @@
+import base64
+import io
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from api.middleware import QueryTimer
+from api.urls import router, urlpatterns
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import override_settings
+from django.urls import URLPattern
+from PIL import Image
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    values = sorted(values)
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+def tiny_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), '#E26C2D').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class Command(BaseCommand):
+    help = ('Замер p50/p99 и числа запросов к БД для всех маршрутов API '
+            'на текущих данных. Изменения в БД откатываются, on_commit '
+            'выполняются после каждого запроса. Кэш, файлы и PDF списков '
+            'покупок пишутся в отдельный LocMem-кэш и временный каталог, '
+            'общий кэш и MEDIA_ROOT не меняются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--output', default='benchmark.json',
+                            help='Файл для результатов в JSON.')
+        parser.add_argument('--compare',
+                            help='Результаты прошлого запуска для сравнения.')
+
+    def handle(self, *args, **options):
+        user = (User.objects.annotate(recipes=Count('recipe'))
+                .filter(recipes__gt=0).order_by('-recipes').first())
+        if user is None:
+            raise CommandError(
+                'Нет рецептов, сначала запустите generate_dataset.')
+        self.client = APIClient(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+        self.anonymous = APIClient(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+        results, covered = [], set()
+        with tempfile.TemporaryDirectory() as media, override_settings(
+                CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': 'benchmark_api',
+                }},
+                MEDIA_ROOT=media,
+                SHOPPING_CART_PDF_CACHE_DIR=os.path.join(
+                    media, 'shopping_cart')), transaction.atomic():
+            token, _ = Token.objects.get_or_create(user=user)
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            user.is_staff = True
+            user.save(update_fields=('is_staff',))
+            self._run_on_commit()
+            for scenario in self._scenarios(user):
+                result, url_name = self._run(scenario, options['repeat'])
+                covered.add(url_name)
+                results.append(result)
+                self.stdout.write(
+                    f'{result["name"]:<40} {result["status"]:>5} '
+                    f'p50={result["p50_ms"]:>8.2f} мс '
+                    f'p99={result["p99_ms"]:>8.2f} мс '
+                    f'запросов={result["queries"]}')
+            transaction.set_rollback(True)
+
+        missing = self._route_names() - covered
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'Маршруты без замеров: {", ".join(sorted(missing))}'))
+        report = {
+            'commit': self._commit(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'recipes': Recipe.objects.count(),
+            'users': User.objects.count(),
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'))
+        if options['compare']:
+            self._compare(options['compare'], results)
+
+    def _scenarios(self, user):
+        """Кортежи (название, клиент, метод, путь, данные, до, после)."""
+        client, anonymous = self.client, self.anonymous
+        own = Recipe.objects.filter(author=user).latest('id')
+        other = (Recipe.objects.exclude(author=user)
+                 .exclude(favourites__user=user)
+                 .exclude(shopping_list__user=user)
+                 .order_by('id').first() or own)
+        author = (User.objects.exclude(id=user.id)
+                  .exclude(following__user=user).order_by('id').first())
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        recipe_data = {
+            'tags': [tag.id],
+            'ingredients': [
+                {'id': item.ingredient_id, 'amount': item.amount}
+                for item in own.ingredients.all()
+            ] or [{'id': ingredient.id, 'amount': 10}],
+            'name': 'Рецепт для замера',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        favorite = f'/api/recipes/{other.id}/favorite/'
+        cart = f'/api/recipes/{other.id}/shopping_cart/'
+        subscribe = f'/api/users/{author.id}/subscribe/'
+        recipe_ids = {'ids': list(
+            Recipe.objects.exclude(author=user)
+            .exclude(favourites__user=user)
+            .exclude(shopping_list__user=user)
+            .order_by('id').values_list('id', flat=True)[:20])}
+        author_ids = {'ids': list(
+            User.objects.exclude(id=user.id)
+            .exclude(following__user=user)
+            .order_by('id').values_list('id', flat=True)[:20])}
+
+        def post(path, data=None):
+            return lambda: client.post(path, data, format='json')
+
+        def delete(path, data=None):
+            return lambda response: client.delete(path, data, format='json')
+
+        def delete_created(response):
+            recipe = Recipe.objects.get(id=response.data['id'])
+            recipe.image.delete(save=False)
+            recipe.delete()
+
+        def create_recipe():
+            response = client.post('/api/recipes/', {
+                **recipe_data, 'image': tiny_image()}, format='json')
+            Recipe.objects.get(id=response.data['id']).image.delete(
+                save=False)
+            return f'/api/recipes/{response.data["id"]}/'
+
+        return [
+            ('api root', anonymous, 'get', '/api/', None, None, None),
+            ('tags list', anonymous, 'get', '/api/tags/', None, None, None),
+            ('tag detail', anonymous, 'get', f'/api/tags/{tag.id}/',
+             None, None, None),
+            ('ingredients list', anonymous, 'get', '/api/ingredients/',
+             None, None, None),
+            ('ingredients search', anonymous, 'get',
+             f'/api/ingredients/?name={ingredient.name[:3]}',
+             None, None, None),
+            ('ingredient detail', anonymous, 'get',
+             f'/api/ingredients/{ingredient.id}/', None, None, None),
+            ('recipes list anonymous', anonymous, 'get', '/api/recipes/',
+             None, None, None),
+            ('recipes list', client, 'get', '/api/recipes/',
+             None, None, None),
+            ('recipes list page 100', client, 'get',
+             '/api/recipes/?page=100', None, None, None),
+            ('recipes list cursor', client, 'get',
+             '/api/recipes/?pagination=cursor', None, None, None),
+            ('recipes by tag', client, 'get',
+             f'/api/recipes/?tags={tag.slug}', None, None, None),
+            ('recipes by author', client, 'get',
+             f'/api/recipes/?author={user.id}', None, None, None),
+            ('recipes search', client, 'get',
+             f'/api/recipes/?search={own.name.split()[0]}', None, None, None),
+            ('recipes favorited', client, 'get',
+             '/api/recipes/?is_favorited=1', None, None, None),
+            ('recipes in cart', client, 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None, None, None),
+            ('recipes feed', client, 'get', '/api/recipes/feed/',
+             None, None, None),
+            ('recipes similar', client, 'get',
+             f'/api/recipes/{own.id}/similar/', None, None, None),
+            ('recipe detail', client, 'get', f'/api/recipes/{own.id}/',
+             None, None, None),
+            ('recipe create', client, 'post', '/api/recipes/',
+             {**recipe_data, 'image': tiny_image()}, None, delete_created),
+            ('recipe update', client, 'patch', f'/api/recipes/{own.id}/',
+             recipe_data, None, None),
+            ('recipe delete', client, 'delete', create_recipe,
+             None, None, None),
+            ('shopping cart txt', client, 'get',
+             '/api/recipes/download_shopping_cart/?format=txt',
+             None, None, None),
+            ('shopping cart csv', client, 'get',
+             '/api/recipes/download_shopping_cart/?format=csv',
+             None, None, None),
+            ('shopping cart pdf', client, 'get',
+             '/api/recipes/download_shopping_cart/?format=pdf',
+             None, None, None),
+            ('favorite add', client, 'post', favorite, None, None,
+             delete(favorite)),
+            ('favorite remove', client, 'delete', favorite, None,
+             post(favorite), None),
+            ('shopping cart add', client, 'post', cart, None, None,
+             delete(cart)),
+            ('shopping cart remove', client, 'delete', cart, None,
+             post(cart), None),
+            ('subscribe', client, 'post', subscribe, None, None,
+             delete(subscribe)),
+            ('unsubscribe', client, 'delete', subscribe, None,
+             post(subscribe), None),
+            ('favorite bulk add', client, 'post', '/api/recipes/favorite/',
+             recipe_ids, None, delete('/api/recipes/favorite/', recipe_ids)),
+            ('favorite bulk remove', client, 'delete',
+             '/api/recipes/favorite/', recipe_ids,
+             post('/api/recipes/favorite/', recipe_ids), None),
+            ('shopping cart bulk add', client, 'post',
+             '/api/recipes/shopping_cart/', recipe_ids, None,
+             delete('/api/recipes/shopping_cart/', recipe_ids)),
+            ('shopping cart bulk remove', client, 'delete',
+             '/api/recipes/shopping_cart/', recipe_ids,
+             post('/api/recipes/shopping_cart/', recipe_ids), None),
+            ('subscribe bulk', client, 'post', '/api/users/subscribe/',
+             author_ids, None, delete('/api/users/subscribe/', author_ids)),
+            ('unsubscribe bulk', client, 'delete', '/api/users/subscribe/',
+             author_ids, post('/api/users/subscribe/', author_ids), None),
+            ('subscriptions', client, 'get', '/api/users/subscriptions/',
+             None, None, None),
+            ('subscriptions recipes_limit', client, 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, None, None),
+            ('users list', client, 'get', '/api/users/', None, None, None),
+            ('users me', client, 'get', '/api/users/me/', None, None, None),
+            ('request stats', client, 'get', '/api/metrics/requests/',
+             None, None, None),
+            ('db pool stats', client, 'get', '/api/metrics/db-pool/',
+             None, None, None),
+        ]
+
+    def _run(self, scenario, repeat):
+        name, client, method, path, data, before, after = scenario
+        durations, queries, statuses, url_name = [], [], set(), None
+        for attempt in range(repeat + 1):
+            if before is not None:
+                before()
+                self._run_on_commit()
+            url = path() if callable(path) else path
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data, format='json')
+                # Выгрузки списка покупок собираются при чтении тела
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                duration = time.perf_counter() - start
+            self._run_on_commit()
+            if after is not None:
+                after(response)
+                self._run_on_commit()
+            if attempt == 0:
+                url_name = response.resolver_match.url_name
+                continue
+            durations.append(duration * 1000)
+            queries.append(timer.count)
+            statuses.add(response.status_code)
+        return {
+            'name': name,
+            'method': method.upper(),
+            'route': url_name,
+            'status': ','.join(map(str, sorted(statuses))),
+            'p50_ms': round(statistics.median(durations), 3),
+            'p99_ms': round(percentile(durations, 99), 3),
+            'queries': max(queries),
+        }, url_name
+
+    @staticmethod
+    def _run_on_commit():
+        # Транзакция откатывается, поэтому сбросы версий в кэше
+        # выполняются так, как после фиксации каждого запроса
+        while connection.run_on_commit:
+            callbacks, connection.run_on_commit = (
+                connection.run_on_commit, [])
+            for _, callback, _ in callbacks:
+                callback()
+
+    @staticmethod
+    def _route_names():
+        names = {pattern.name for pattern in router.urls if pattern.name}
+        names.update(pattern.name for pattern in urlpatterns
+                     if isinstance(pattern, URLPattern))
+        return names
+
+    @staticmethod
+    def _commit():
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            previous = {row['name']: row for row in json.load(file)['results']}
+        self.stdout.write(f'Сравнение с {path}:')
+        for row in results:
+            old = previous.get(row['name'])
+            if old is None:
+                continue
+            self.stdout.write(
+                f'{row["name"]:<40} p50 {old["p50_ms"]:>8.2f} → '
+                f'{row["p50_ms"]:>8.2f} мс, запросов {old["queries"]} → '
+                f'{row["queries"]}')
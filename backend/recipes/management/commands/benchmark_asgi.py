@@ -0,0 +1,207 @@
+import asyncio
+import io
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from recipes.models import Ingredient, Recipe
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнение пропускной способности маршрутов чтения под WSGI '
+            '(пул синхронных воркеров) и под ASGI (async-вьюхи в одном '
+            'цикле событий) при одинаковом числе параллельных клиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на маршрут в каждом режиме.')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Синхронных воркеров WSGI.')
+        parser.add_argument('--client-delay', type=float, default=0,
+                            help='Сколько миллисекунд клиент забирает '
+                                 'ответ, для имитации медленной сети.')
+        parser.add_argument('--output',
+                            help='Файл для результатов в JSON.')
+
+    def handle(self, *args, **options):
+        if not settings.ASYNC_READ_URLCONF:
+            raise CommandError('Async-вьюхи отключены: ASYNC_READ_URLCONF.')
+        user = (User.objects.annotate(cart=Count('shopping_list'))
+                .order_by('-cart', 'id').first())
+        recipe = Recipe.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or ingredient is None:
+            raise CommandError(
+                'Нет рецептов, сначала запустите generate_dataset.')
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.delay = options['client_delay'] / 1000
+        token, created = Token.objects.get_or_create(user=user)
+        authorization = {'authorization': f'Token {token.key}'}
+        routes = [
+            ('tags list', '/api/tags/', '', {}),
+            ('ingredients search', '/api/ingredients/',
+             urlencode({'name': ingredient.name[:3]}), {}),
+            ('recipes list', '/api/recipes/', '', authorization),
+            ('recipes search', '/api/recipes/',
+             urlencode({'search': recipe.name.split()[0]}), authorization),
+            ('recipe detail', f'/api/recipes/{recipe.id}/', '',
+             authorization),
+            ('shopping cart txt', '/api/recipes/download_shopping_cart/',
+             'format=txt', authorization),
+        ]
+        wsgi, asgi = WSGIHandler(), ASGIHandler()
+        results = []
+        try:
+            for name, path, query, headers in routes:
+                request = (path, query, headers)
+                wsgi_result = self._run_wsgi(wsgi, request, options)
+                asgi_result = asyncio.run(
+                    self._run_asgi(asgi, request, options))
+                if wsgi_result.pop('body') != asgi_result.pop('body'):
+                    self.stdout.write(self.style.WARNING(
+                        f'{name}: ответы WSGI и ASGI различаются'))
+                results.append({'name': name, 'wsgi': wsgi_result,
+                                'asgi': asgi_result})
+                self.stdout.write(
+                    f'{name:<22} '
+                    + '  '.join(
+                        f'{mode.upper()} {row["rps"]:>7.1f} rps '
+                        f'p50={row["p50_ms"]:>7.1f} p99={row["p99_ms"]:>7.1f}'
+                        for mode, row in (('wsgi', wsgi_result),
+                                          ('asgi', asgi_result))))
+        finally:
+            if created:
+                token.delete()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'database': connections['default'].vendor,
+                    'concurrency': options['concurrency'],
+                    'workers': options['workers'],
+                    'client_delay_ms': options['client_delay'],
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результаты записаны в {options["output"]}'))
+
+    def _run_wsgi(self, handler, request, options):
+        """Воркер занят, пока клиент не заберёт ответ целиком."""
+        clients = threading.BoundedSemaphore(options['concurrency'])
+
+        def serve(started):
+            status = []
+            try:
+                response = handler(
+                    self._environ(*request),
+                    lambda code, headers: status.append(int(code[:3])))
+                try:
+                    body = b''.join(response)
+                    time.sleep(self.delay)
+                finally:
+                    response.close()
+            finally:
+                clients.release()
+            return status[0], body, time.perf_counter() - started
+
+        with ThreadPoolExecutor(options['workers']) as pool:
+            start = time.perf_counter()
+            futures = []
+            for _ in range(options['requests']):
+                clients.acquire()
+                futures.append(pool.submit(serve, time.perf_counter()))
+            responses = [future.result() for future in futures]
+            duration = time.perf_counter() - start
+        return self._summary(responses, duration)
+
+    async def _run_asgi(self, application, request, options):
+        clients = asyncio.Semaphore(options['concurrency'])
+
+        async def serve():
+            async with clients:
+                started = time.perf_counter()
+                status, body = await self._asgi_request(application, *request)
+                return status, body, time.perf_counter() - started
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(serve() for _ in range(options['requests'])))
+        return self._summary(responses, time.perf_counter() - start)
+
+    async def _asgi_request(self, application, path, query, headers):
+        messages = [{'type': 'http.request', 'body': b''}]
+        status, body = [], []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif message['type'] == 'http.response.body':
+                body.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    await asyncio.sleep(self.delay)
+
+        await application({
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode())] + [
+                (name.encode(), value.encode())
+                for name, value in headers.items()],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }, receive, send)
+        return status[0], b''.join(body)
+
+    def _environ(self, path, query, headers):
+        return {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            **{f'HTTP_{name.upper()}': value
+               for name, value in headers.items()},
+        }
+
+    @staticmethod
+    def _summary(responses, duration):
+        latencies = [latency * 1000 for _, _, latency in responses]
+        return {
+            'status': ','.join(map(str, sorted({
+                status for status, _, _ in responses}))),
+            'rps': round(len(responses) / duration, 1),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'body': responses[0][1],
+        }
@@ -0,0 +1,53 @@
+import csv
+import timeit
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.autocomplete import IngredientIndex
+from recipes.models import Ingredient
+
+DEFAULT_CSV = Path(settings.BASE_DIR).parent / 'data' / 'ingredients.csv'
+
+
+class Command(BaseCommand):
+    help = ('Сравнение поиска ингредиентов по индексу в памяти '
+            'и фильтра startswith в БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(DEFAULT_CSV))
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with open(options['path'], encoding='utf-8') as f:
+            rows = [(number, name, unit) for number, (name, unit)
+                    in enumerate(csv.reader(f), start=1)]
+        index = IngredientIndex(rows)
+        repeat = options['repeat']
+        self.stdout.write(f'Ингредиентов: {len(rows)}')
+        self.stdout.write('Длина запроса | ORM startswith, мкс | Индекс, мкс')
+
+        with transaction.atomic():
+            # После loaddata те же ингредиенты уже есть в БД
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for _, name, unit in rows),
+                ignore_conflicts=True,
+            )
+            for length in (1, 2, 3, 5):
+                queries = sorted({name[:length] for _, name, _ in rows[::50]})
+                orm = self._measure(
+                    lambda q: list(Ingredient.objects.filter(
+                        name__startswith=q)),
+                    queries, repeat)
+                memory = self._measure(index.lookup, queries, repeat * 10)
+                self.stdout.write(
+                    f'{length:>13} | {orm:>19.1f} | {memory:>11.1f}')
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _measure(search, queries, repeat):
+        total = timeit.timeit(
+            lambda: [search(query) for query in queries], number=repeat)
+        return total / repeat / len(queries) * 1e6
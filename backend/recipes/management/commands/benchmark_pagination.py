@@ -0,0 +1,78 @@
+import timeit
+
+from api.pagination import RecipeCursorPagination
+from api.views import RecipeViewSet
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+URL = '/api/recipes/'
+
+
+class Command(BaseCommand):
+    help = ('Сравнение постраничного вывода рецептов по номеру страницы '
+            'и по курсору на глубоких страницах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        view = RecipeViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        self.stdout.write(f'Рецептов: {options["recipes"]}')
+        self.stdout.write('Страница | page, мс | cursor, мс')
+
+        with transaction.atomic():
+            self._create_recipes(options['recipes'])
+            ids = list(Recipe.objects.order_by('-id').values_list(
+                'id', flat=True))
+            pages = len(ids) // limit
+            for page in (1, 10, 100, 1000, 10000):
+                if page > pages:
+                    break
+                page_url = f'{URL}?page={page}&limit={limit}'
+                cursor_url = self._cursor_url(
+                    ids[(page - 1) * limit - 1] if page > 1 else None,
+                    limit)
+                by_page = self._measure(
+                    view, factory.get(page_url), options['repeat'])
+                by_cursor = self._measure(
+                    view, factory.get(cursor_url), options['repeat'])
+                self.stdout.write(
+                    f'{page:>8} | {by_page:>8.1f} | {by_cursor:>10.1f}')
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _create_recipes(count):
+        author = User.objects.create_user(
+            username='benchmark', email='benchmark@example.com',
+            first_name='benchmark', last_name='benchmark')
+        Recipe.objects.bulk_create(
+            (Recipe(author=author, name=f'Рецепт {number}', text='Описание',
+                    cooking_time=number % 120 + 1,
+                    image='recipe/benchmark.jpg')
+             for number in range(count)),
+            batch_size=5000,
+        )
+
+    @staticmethod
+    def _cursor_url(position, limit):
+        url = f'{URL}?pagination=cursor&limit={limit}'
+        if position is None:
+            return url
+        paginator = RecipeCursorPagination()
+        paginator.base_url = url
+        paginator.page_size = limit
+        return paginator.encode_cursor(Cursor(
+            offset=0, reverse=False, position=position))
+
+    @staticmethod
+    def _measure(view, request, repeat):
+        total = timeit.timeit(lambda: view(request).render(), number=repeat)
+        return total / repeat * 1e3
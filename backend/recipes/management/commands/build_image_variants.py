@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes.images import build_variants, variants_outdated
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий фото для уже загруженных рецептов.'
+
+    def handle(self, *args, **options):
+        built = 0
+        for recipe in Recipe.objects.exclude(image='').exclude(
+                image__isnull=True).iterator():
+            if variants_outdated(recipe):
+                build_variants(recipe.pk, recipe.image.name)
+                built += 1
+        self.stdout.write(f'Обработано рецептов: {built}')
@@ -0,0 +1,82 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from recipes.models import (Favourites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, ShoppingListTotal)
+from users.models import Follow
+
+INDEX_USAGE = {
+    'postgresql': re.compile(r'Index Scan|Index Only Scan|Bitmap Index Scan'),
+    'sqlite': re.compile(r'USING (COVERING )?INDEX|USING INTEGER PRIMARY KEY'),
+}
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Выполнение EXPLAIN для частых запросов API и проверка '
+            'использования индексов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=1)
+        parser.add_argument('--recipe', type=int, default=1)
+        parser.add_argument(
+            '--allow-seqscan', action='store_true',
+            help='Не запрещать PostgreSQL последовательное сканирование. '
+                 'На маленькой базе планировщик всегда выбирает его.')
+        parser.add_argument('--verbose-plan', action='store_true')
+
+    def hot_queries(self, user_id, recipe_id):
+        return {
+            'Лента рецептов': Recipe.objects.order_by('-id')[:6],
+            'Рецепты автора': (Recipe.objects.filter(author_id=user_id)
+                               .order_by('-id')[:6]),
+            'Рецепты по тегу': (Recipe.objects.filter(tags__slug='breakfast')
+                                .order_by('-id')[:6]),
+            'Фильтр избранного': Recipe.objects.filter(
+                favourites__user_id=user_id),
+            'Фильтр списка покупок': Recipe.objects.filter(
+                shopping_list__user_id=user_id),
+            'Флаг избранного': Favourites.objects.filter(
+                user_id=user_id, recipe_id=recipe_id)[:1],
+            'Флаг списка покупок': ShoppingList.objects.filter(
+                user_id=user_id, recipe_id=recipe_id)[:1],
+            'Флаг подписки': Follow.objects.filter(
+                user_id=user_id, author_id=recipe_id)[:1],
+            'Подписки пользователя': Follow.objects.filter(user_id=user_id),
+            'Ингредиенты рецепта': RecipeIngredient.objects.filter(
+                recipe_id=recipe_id),
+            'Итоги списка покупок': ShoppingListTotal.objects.filter(
+                user_id=user_id),
+            'Поиск ингредиента': Ingredient.objects.filter(
+                name__startswith='мол'),
+        }
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in INDEX_USAGE:
+            self.stderr.write(f'EXPLAIN для {vendor} не поддерживается.')
+            return
+        queries = self.hot_queries(options['user'], options['recipe'])
+        with transaction.atomic():
+            if vendor == 'postgresql' and not options['allow_seqscan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for title, queryset in queries.items():
+                plan = queryset.explain()
+                uses_index = bool(INDEX_USAGE[vendor].search(plan))
+                scanned = sorted(set(SEQUENTIAL_SCAN[vendor].findall(plan)))
+                if uses_index and not scanned:
+                    status = self.style.SUCCESS('индекс')
+                elif uses_index:
+                    status = self.style.WARNING(
+                        f'индекс, полный просмотр: {", ".join(scanned)}')
+                else:
+                    status = self.style.ERROR(
+                        f'полный просмотр: {", ".join(scanned) or "?"}')
+                self.stdout.write(f'{title}: {status}')
+                if options['verbose_plan']:
+                    self.stdout.write(plan)
@@ -0,0 +1,162 @@
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.counters import counter_drift, repair_counters
+from recipes.feed import rebuild_feeds
+from recipes.models import (Favourites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag)
+from recipes.totals import rebuild_totals
+from users.models import Follow, User
+
+USERNAME_PREFIX = 'dataset_user_'
+PASSWORD = 'dataset-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B8860B', 'baking'),
+)
+WORDS = ('Суп', 'Салат', 'Пирог', 'Каша', 'Рагу', 'Запеканка', 'Котлеты',
+         'Паста', 'Омлет', 'Блины', 'Плов', 'Пицца')
+ADJECTIVES = ('домашний', 'быстрый', 'праздничный', 'летний', 'острый',
+              'сытный', 'бабушкин', 'лёгкий', 'постный', 'сырный')
+
+
+class Command(BaseCommand):
+    help = ('Создание воспроизводимого набора данных: пользователи, рецепты '
+            'с ингредиентами из справочника, подписки, избранное и списки '
+            'покупок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, nargs=2,
+                            default=(3, 12), metavar=('MIN', 'MAX'),
+                            help='Число ингредиентов в рецепте.')
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя в среднем.')
+        parser.add_argument('--favourites', type=int, default=30,
+                            help='Рецептов в избранном в среднем.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Рецептов в списке покупок в среднем.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить ранее созданный набор данных.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        generated = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if options['clear']:
+            deleted, _ = generated.delete()
+            rebuild_totals()
+            repair_counters(list(counter_drift()))
+            rebuild_feeds()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        elif generated.exists():
+            raise CommandError(
+                'Набор данных уже создан, используйте --clear.')
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        if not Ingredient.objects.exists():
+            call_command('loaddata', stdout=self.stdout)
+
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            users = self._create_users(options['users'])
+            tags = self._create_tags()
+            recipes = self._create_recipes(users, tags, options)
+            self._create_relations(users, recipes, options)
+            rebuild_totals()
+            repair_counters(list(counter_drift()))
+            rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пароль пользователей {USERNAME_PREFIX}*: {PASSWORD}'))
+
+    def _create_users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (User(username=f'{USERNAME_PREFIX}{number}',
+                  email=f'{USERNAME_PREFIX}{number}@example.com',
+                  first_name=f'Имя {number}',
+                  last_name=f'Фамилия {number}',
+                  password=password)
+             for number in range(count)),
+            batch_size=self.batch_size,
+        )
+        users = list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+        self.stdout.write(f'Пользователей: {len(users)}')
+        return sorted(users)
+
+    def _create_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        return sorted(Tag.objects.values_list('id', flat=True))
+
+    def _create_recipes(self, users, tags, options):
+        rng = self.random
+        ingredients = sorted(Ingredient.objects.values_list('id', flat=True))
+        low, high = options['ingredients']
+        high = min(high, len(ingredients))
+        # Небольшая доля авторов пишет большую часть рецептов
+        authors = rng.choices(
+            users, weights=[1 / (rank + 1) for rank in range(len(users))],
+            k=options['recipes'])
+        Recipe.objects.bulk_create(
+            (Recipe(author_id=author,
+                    name=f'{rng.choice(WORDS)} {rng.choice(ADJECTIVES)} '
+                         f'№{number}',
+                    text='Смешать ингредиенты и готовить до готовности.',
+                    cooking_time=rng.randint(5, 180),
+                    image='recipe/dataset.jpg')
+             for number, author in enumerate(authors)),
+            batch_size=self.batch_size,
+        )
+        recipes = sorted(Recipe.objects.filter(
+            author_id__in=users).values_list('id', flat=True))
+        self._bulk_create(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe, ingredient_id=ingredient,
+                             amount=rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rng.sample(
+                ingredients, min(rng.randint(low, max(low, high)), high))
+        ))
+        self._bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in rng.sample(tags, rng.randint(1, min(3, len(tags))))
+        ))
+        self.stdout.write(f'Рецептов: {len(recipes)}')
+        return recipes
+
+    def _create_relations(self, users, recipes, options):
+        rng = self.random
+        self._bulk_create(Follow, (
+            Follow(user_id=user, author_id=author)
+            for user in users
+            for author in rng.sample(
+                users, min(rng.randint(0, 2 * options['follows']),
+                           len(users)))
+            if author != user
+        ))
+        for model, average in ((Favourites, options['favourites']),
+                               (ShoppingList, options['cart'])):
+            self._bulk_create(model, (
+                model(user_id=user, recipe_id=recipe)
+                for user in users
+                for recipe in rng.sample(
+                    recipes, min(rng.randint(0, 2 * average), len(recipes)))
+            ))
+        self.stdout.write(
+            f'Подписок: {Follow.objects.filter(user_id__in=users).count()}')
+
+    def _bulk_create(self, model, objects):
+        while batch := list(islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch)
@@ -1,19 +1,156 @@
+import csv
+import io
 import json
+import re
+from collections import Counter
+from functools import partial
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
+from recipes.versioning import bump_version
+
+DEFAULT_PATH = Path(__file__).resolve().parent / 'data' / 'ingredients.json'
+MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+STAGING_TABLE = 'ingredient_staging'
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    """Строки CSV вида «название,единица измерения»."""
+    for row in csv.reader(file):
+        if row:
+            yield (row + [''])[:2]
+
+
+def read_json(file, chunk_size=1 << 16):
+    """Объекты JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size)
+    start = re.match(r'\s*\[', buffer)
+    if start is None:
+        raise ValueError('Ожидается JSON-массив объектов')
+    position, eof = start.end(), False
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+            continue
+        if isinstance(item, dict):
+            yield item.get('name'), item.get('measurement_unit')
+        else:
+            yield None, None
+
+
+READERS = {'csv': read_csv, 'json': read_json}
 
 
 class Command(BaseCommand):
+    help = ('Загрузка ингредиентов из CSV или JSON. Уже существующие '
+            'пары «название, единица измерения» пропускаются, поэтому '
+            'загрузку можно повторять.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_PATH))
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению.')
+        parser.add_argument('--batch-size', type=int, default=5000)
 
     def handle(self, *args, **options):
-        with open(
-            'recipes/management/commands/data/ingredients.json', 'rb'
-        ) as f:
-            data = json.load(f)
-            Ingredient.objects.bulk_create(
-                [Ingredient(
-                    name=item['name'],
-                    measurement_unit=item['measurement_unit']
-                ) for item in data]
-            )
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path.name}')
+        stats = Counter()
+        try:
+            with open(path, encoding='utf-8', newline='') as file, \
+                    transaction.atomic(), connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    self._create_staging(cursor)
+                    upsert = partial(self._merge_batch, cursor)
+                else:
+                    upsert = self._insert_batch
+                rows = self._clean(READERS[file_format](file), stats)
+                while batch := list(islice(rows, options['batch_size'])):
+                    stats['inserted'] += upsert(batch)
+                    self.stdout.write(
+                        f'Прочитано: {stats["read"]}, '
+                        f'добавлено: {stats["inserted"]}')
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        except ValueError as error:
+            raise CommandError(f'Некорректный файл {path}: {error}')
+        if stats['inserted']:
+            bump_version(Ingredient)
+        existing = stats['read'] - stats['invalid'] - stats['inserted']
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк в файле: {stats["read"]}, '
+            f'добавлено: {stats["inserted"]}, '
+            f'уже были: {existing}, '
+            f'пропущено некорректных: {stats["invalid"]}'))
+
+    @staticmethod
+    def _clean(rows, stats):
+        for name, measurement_unit in rows:
+            stats['read'] += 1
+            if not (isinstance(name, str)
+                    and isinstance(measurement_unit, str)):
+                stats['invalid'] += 1
+                continue
+            name, measurement_unit = name.strip(), measurement_unit.strip()
+            if (not name or not measurement_unit
+                    or len(name) > MAX_LENGTH
+                    or len(measurement_unit) > MAX_LENGTH):
+                stats['invalid'] += 1
+                continue
+            yield name, measurement_unit
+
+    @staticmethod
+    def _insert_batch(batch):
+        """Добавление пачки через ORM для баз без COPY."""
+        batch = dict.fromkeys(batch)
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in batch}
+        ).values_list('name', 'measurement_unit'))
+        new = [key for key in batch if key not in existing]
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in new),
+            ignore_conflicts=True,
+        )
+        return len(new)
+
+    @staticmethod
+    def _create_staging(cursor):
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+            f'(name varchar({MAX_LENGTH}), '
+            f'measurement_unit varchar({MAX_LENGTH})) ON COMMIT DROP')
+
+    @staticmethod
+    def _merge_batch(cursor, batch):
+        """COPY пачки во временную таблицу и перенос новых строк."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {STAGING_TABLE} (name, measurement_unit) '
+            f'FROM STDIN WITH (FORMAT csv)', buffer)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            f'SELECT DISTINCT name, measurement_unit FROM {STAGING_TABLE} '
+            f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+        inserted = cursor.rowcount
+        cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+        return inserted
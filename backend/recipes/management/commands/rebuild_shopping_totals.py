@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.totals import live_totals, rebuild_totals, stored_totals
+
+
+class Command(BaseCommand):
+    help = ('Пересоздание итогов списков покупок и сверка '
+            'с агрегацией по рецептам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить итоги, не пересоздавая таблицу.')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rebuild_totals()
+            self.stdout.write('Итоги списков покупок пересозданы.')
+        live, stored = live_totals(), stored_totals()
+        mismatched = {key for key in live.keys() | stored.keys()
+                      if live.get(key) != stored.get(key)}
+        for user_id, ingredient_id in sorted(mismatched)[:20]:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'ожидается {live.get((user_id, ingredient_id))}, '
+                f'сохранено {stored.get((user_id, ingredient_id))}')
+        if mismatched:
+            raise CommandError(f'Расхождений: {len(mismatched)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги совпадают, строк: {len(stored)}'))
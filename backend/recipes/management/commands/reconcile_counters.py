@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.counters import counter_drift, repair_counters
+
+
+class Command(BaseCommand):
+    help = ('Сверка счётчиков избранного, рецептов и подписчиков '
+            'с подсчётом по связям и исправление расхождений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только найти расхождения, не исправляя их.')
+
+    def handle(self, *args, **options):
+        drift = list(counter_drift())
+        for model, field, pk, stored, actual in drift[:20]:
+            self.stdout.write(
+                f'{model._meta.label_lower} id={pk} {field}: '
+                f'сохранено {stored}, по связям {actual}')
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Счётчики совпадают.'))
+        elif options['check']:
+            raise CommandError(f'Расхождений: {len(drift)}')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено счётчиков: {repair_counters(drift)}'))
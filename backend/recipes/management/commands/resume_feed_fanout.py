@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import resume_fan_out
+
+
+class Command(BaseCommand):
+    help = ('Запись рецептов в ленты подписчиков для авторов, у которых '
+            'подписчиков стало меньше FEED_FANOUT_RESUME_LIMIT.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Авторов с записью в ленты: {resume_fan_out()}'))
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name, fields in (('Favourites', ('user', 'recipe')),
+                               ('ShoppingList', ('user', 'recipe'))):
+        model = apps.get_model('recipes', model_name)
+        kept = model.objects.values(*fields).annotate(
+            first_id=models.Min('id')).values('first_id')
+        model.objects.exclude(id__in=kept).delete()
+
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = (RecipeIngredient.objects
+                  .values('recipe', 'ingredient')
+                  .annotate(first_id=models.Min('id'),
+                            total=models.Sum('amount'),
+                            rows=models.Count('id'))
+                  .filter(rows__gt=1))
+    for duplicate in duplicates:
+        RecipeIngredient.objects.filter(
+            recipe=duplicate['recipe'], ingredient=duplicate['ingredient']
+        ).exclude(id=duplicate['first_id']).delete()
+        RecipeIngredient.objects.filter(id=duplicate['first_id']).update(
+            amount=duplicate['total'])
+
+    ShoppingListTotal = apps.get_model('recipes', 'ShoppingListTotal')
+    ShoppingListTotal.objects.all().delete()
+    ShoppingListTotal.objects.bulk_create(
+        (ShoppingListTotal(user_id=row['recipe__shopping_list__user'],
+                           ingredient_id=row['ingredient'],
+                           amount=row['amount'])
+         for row in RecipeIngredient.objects
+         .filter(recipe__shopping_list__isnull=False)
+         .values('recipe__shopping_list__user', 'ingredient')
+         .annotate(amount=models.Sum('amount'))
+         .order_by()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppinglisttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_prefix_idx', opclasses=('varchar_pattern_ops',)),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favourites',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favourite'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_list'),
+        ),
+    ]
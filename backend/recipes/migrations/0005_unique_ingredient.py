@@ -0,0 +1,48 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    duplicates = (Ingredient.objects
+                  .values('name', 'measurement_unit')
+                  .annotate(first_id=models.Min('id'),
+                            rows=models.Count('id'))
+                  .filter(rows__gt=1))
+    for duplicate in duplicates:
+        kept = duplicate['first_id']
+        extra = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=kept).values_list('id', flat=True))
+        for model_name, owner in (('RecipeIngredient', 'recipe_id'),
+                                  ('ShoppingListTotal', 'user_id')):
+            model = apps.get_model('recipes', model_name)
+            for row in model.objects.filter(ingredient_id__in=extra):
+                target = model.objects.filter(
+                    ingredient_id=kept, **{owner: getattr(row, owner)}
+                ).first()
+                if target is None:
+                    row.ingredient_id = kept
+                    row.save(update_fields=('ingredient',))
+                else:
+                    target.amount += row.amount
+                    target.save(update_fields=('amount',))
+                    row.delete()
+        Ingredient.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:32
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_favourites(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favourites = apps.get_model('recipes', 'Favourites')
+    Recipe.objects.update(favourites_count=Coalesce(models.Subquery(
+        Favourites.objects.filter(recipe=models.OuterRef('pk'))
+        .values('recipe').annotate(total=models.Count('id'))
+        .values('total')[:1]
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favourites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавили в избранное'),
+        ),
+        migrations.RunPython(count_favourites, migrations.RunPython.noop),
+    ]
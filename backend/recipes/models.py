@@ -1,4 +1,5 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from users.models import User
@@ -40,6 +41,17 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = (
+            models.Index(fields=('name',),
+                         name='ingredient_name_prefix_idx',
+                         opclasses=('varchar_pattern_ops',)),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -62,14 +74,35 @@ class Recipe(models.Model):
                               null=True,
                               default=None
                               )
+    image_thumbnail = models.ImageField('Миниатюра фото',
+                                        upload_to='recipe/thumbnail/',
+                                        null=True,
+                                        blank=True,
+                                        editable=False
+                                        )
+    image_medium = models.ImageField('Фото среднего размера',
+                                     upload_to='recipe/medium/',
+                                     null=True,
+                                     blank=True,
+                                     editable=False
+                                     )
     text = models.TextField('Описание рецепта')
     tags = models.ManyToManyField(Tag, verbose_name='Теги')
     cooking_time = models.PositiveIntegerField('Время приготовления')
+    favourites_count = models.PositiveIntegerField('Добавили в избранное',
+                                                   default=0,
+                                                   editable=False)
+    search_vector = SearchVectorField('Поисковый вектор', null=True,
+                                      editable=False)
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ("-id",)
+        indexes = (
+            models.Index(fields=('author', '-id'),
+                         name='recipe_author_id_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -102,6 +135,12 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient'
+            ),
+        )
 
     def __str__(self):
         return f'{self.amount}гр. {self.ingredient.name} в {self.recipe.name}'
@@ -125,6 +164,12 @@ class Favourites(models.Model):
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favourite'
+            ),
+        )
 
     def __str__(self):
         return f'Пользователь {self.user} добавил в избранное {self.recipe}'
@@ -148,6 +193,81 @@ class ShoppingList(models.Model):
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_list'
+            ),
+        )
 
     def __str__(self):
         return f'Список покупок {self.user}'
+
+
+class ShoppingListTotal(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_totals'
+    )
+    amount = models.PositiveIntegerField('Количество ингредиента')
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_total'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.amount} {self.ingredient}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
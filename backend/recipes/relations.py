@@ -0,0 +1,156 @@
+from array import array
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from users.models import Follow, User
+
+from .counters import change_counters
+from .feed import follows_added, follows_removed
+from .models import Favourites, Recipe, ShoppingList
+from .totals import change_totals, recipes_amounts
+from .versioning import bump_version, get_versions
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_ADDED = 'already_added'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+# Записи прежних версий не удаляются, а истекают
+STATE_TIMEOUT = 24 * 60 * 60
+
+RelationState = namedtuple(
+    'RelationState', ('favourites', 'shopping_list', 'follows'))
+EMPTY_STATE = RelationState(frozenset(), frozenset(), frozenset())
+STATE_FIELDS = RelationState(
+    (Favourites, 'recipe_id'), (ShoppingList, 'recipe_id'),
+    (Follow, 'author_id'))
+
+
+def relation_state(user):
+    """Id рецептов в избранном и в списке покупок и id авторов из подписок.
+
+    Множества хранятся в общем кэше под ключами с версией пользователя
+    для каждой связи, из БД читаются только связи, версия которых
+    изменилась.
+    """
+    if user.is_anonymous:
+        return EMPTY_STATE
+    versions = get_versions([(model, user.id) for model, _ in STATE_FIELDS])
+    keys = [f'relations:{model._meta.label_lower}:{user.id}:{version}'
+            for (model, _), version in zip(STATE_FIELDS, versions)]
+    found = cache.get_many(keys)
+    missing = {}
+    for (model, field), key in zip(STATE_FIELDS, keys):
+        if key not in found:
+            missing[key] = array('q', model.objects.filter(
+                user_id=user.id).values_list(field, flat=True))
+    if missing:
+        cache.set_many(missing, timeout=STATE_TIMEOUT)
+    found.update(missing)
+    return RelationState(*(frozenset(found[key]) for key in keys))
+
+
+def relations_changed(model, user_id):
+    """Сброс закэшированных связей пользователя после фиксации записи."""
+    transaction.on_commit(lambda: bump_version(model, user_id))
+
+
+def _favourites_changed(user_id, recipe_ids, sign):
+    change_counters(Recipe, 'favourites_count', recipe_ids, sign)
+
+
+def _shopping_list_changed(user_id, recipe_ids, sign):
+    if recipe_ids:
+        change_totals([user_id], {
+            pk: sign * amount
+            for pk, amount in recipes_amounts(recipe_ids).items()
+        })
+
+
+def _follows_changed(user_id, author_ids, sign):
+    change_counters(User, 'followers_count', author_ids, sign)
+    if sign > 0:
+        follows_added(user_id, author_ids)
+    else:
+        follows_removed(user_id, author_ids)
+
+
+class BulkRelation:
+    """Массовое добавление и удаление связей пользователя с объектами.
+
+    На любое число id уходит одинаковое число запросов: строки вставляются
+    одним bulk_create и удаляются одним DELETE без сигналов, а счётчики,
+    итоги списка покупок и ленты обновляются так же пачкой.
+    """
+
+    def __init__(self, model, field, target, changed):
+        self.model = model
+        self.field = field
+        self.target = target
+        self.changed = changed
+
+    def _linked(self, user, ids):
+        return set(self.model.objects.filter(
+            user=user, **{f'{self.field}_id__in': ids}
+        ).values_list(f'{self.field}_id', flat=True))
+
+    @staticmethod
+    def _lock(user):
+        # Запросы одного пользователя выполняются по очереди, иначе
+        # параллельная вставка тех же строк дважды изменит счётчики
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+
+    @transaction.atomic
+    def add(self, user, ids):
+        """Добавление связей, результат для каждого id."""
+        ids = list(dict.fromkeys(ids))
+        self._lock(user)
+        found = set(self.target.objects.filter(id__in=ids)
+                    .values_list('id', flat=True))
+        if self.target is User:
+            found.discard(user.id)
+        linked = self._linked(user, found)
+        new = [pk for pk in ids if pk in found and pk not in linked]
+        self.model.objects.bulk_create(
+            (self.model(user=user, **{f'{self.field}_id': pk})
+             for pk in new),
+            ignore_conflicts=True)
+        self.changed(user.id, new, 1)
+        if new:
+            relations_changed(self.model, user.id)
+        return {pk: self._add_status(user, pk, found, linked) for pk in ids}
+
+    def _add_status(self, user, pk, found, linked):
+        if pk in linked:
+            return ALREADY_ADDED
+        if pk in found:
+            return ADDED
+        if self.target is User and pk == user.id:
+            return SELF
+        return NOT_FOUND
+
+    @transaction.atomic
+    def remove(self, user, ids):
+        """Удаление связей, результат для каждого id."""
+        ids = list(dict.fromkeys(ids))
+        self._lock(user)
+        linked = self._linked(user, ids)
+        removed = [pk for pk in ids if pk in linked]
+        if removed:
+            rows = self.model.objects.filter(
+                user=user, **{f'{self.field}_id__in': removed})
+            # Одним DELETE без сигналов post_delete: счётчики, итоги
+            # и ленты меняет self.changed, сигналы изменили бы их повторно
+            rows._raw_delete(rows.db)
+            relations_changed(self.model, user.id)
+        self.changed(user.id, removed, -1)
+        return {pk: REMOVED if pk in linked else NOT_ADDED for pk in ids}
+
+
+favourites = BulkRelation(Favourites, 'recipe', Recipe, _favourites_changed)
+shopping_list = BulkRelation(
+    ShoppingList, 'recipe', Recipe, _shopping_list_changed)
+follows = BulkRelation(Follow, 'author', User, _follows_changed)
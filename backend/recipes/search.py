@@ -0,0 +1,245 @@
+import heapq
+import re
+import threading
+from collections import defaultdict
+from itertools import chain
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+
+from .models import Ingredient, Recipe, RecipeIngredient
+from .versioning import bump_version, get_versions
+
+SEARCH_CONFIG = 'russian'
+# Веса полей как у ts_rank по умолчанию: A — название, B — ингредиенты,
+# C — описание
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+# Журнал изменённых рецептов в кэше читается, если процесс отстал
+# не больше чем на MAX_LOG_GAP записей, иначе индекс строится заново
+MAX_LOG_GAP = 1000
+LOG_TIMEOUT = 24 * 60 * 60
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а',
+    'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же',
+    'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от',
+    'меня', 'еще', 'нет', 'о', 'из', 'ему', 'для', 'до', 'или', 'ни',
+    'при', 'без', 'под', 'над', 'об', 'это', 'этот', 'их', 'чем', 'где',
+))
+
+VOWELS = 'аеиоуыэюя'
+RV_START = re.compile(f'[{VOWELS}]')
+R_START = re.compile(f'[{VOWELS}][^{VOWELS}]')
+PERFECTIVE_GERUND = re.compile(
+    r'((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$')
+REFLEXIVE = re.compile(r'(ся|сь)$')
+ADJECTIVE = (r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему'
+             r'|ому|их|ых|ую|юю|ая|яя|ою|ею)')
+PARTICIPLE = r'((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))'
+ADJECTIVAL = re.compile(f'({PARTICIPLE})?{ADJECTIVE}$')
+VERB = re.compile(
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)'
+    r'|(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю))$')
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием'
+    r'|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'ейше?$')
+WORD = re.compile(r'\w+')
+
+
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка."""
+    word = word.replace('ё', 'е')
+    rv_start = RV_START.search(word)
+    if rv_start is None:
+        return word
+    prefix, rv = word[:rv_start.end()], word[rv_start.end():]
+    rv, found = PERFECTIVE_GERUND.subn('', rv)
+    if not found:
+        rv = REFLEXIVE.sub('', rv)
+        for ending in (ADJECTIVAL, VERB, NOUN):
+            rv, found = ending.subn('', rv)
+            if found:
+                break
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    derivational = DERIVATIONAL.search(rv)
+    if derivational and len(prefix) + derivational.start() >= _r2(word):
+        rv = rv[:derivational.start()]
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv, found = SUPERLATIVE.subn('', rv)
+        if found and rv.endswith('нн'):
+            rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def _r2(word):
+    r1 = R_START.search(word)
+    if r1 is None:
+        return len(word)
+    r2 = R_START.search(word, r1.end())
+    return len(word) if r2 is None else r2.end()
+
+
+def terms(text):
+    """Основы слов текста без стоп-слов."""
+    return [stem(word) for word in WORD.findall(text.casefold())
+            if word not in STOP_WORDS]
+
+
+def search_vector(ingredient_model=RecipeIngredient):
+    """Выражение для поля Recipe.search_vector в PostgreSQL."""
+    ingredient_names = Subquery(
+        ingredient_model.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(ingredient_names, weight='B',
+                           config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG))
+
+
+def _log_key(number):
+    return f'search:changes:{number}'
+
+
+def update_search_vectors(recipe_ids):
+    """Пересчёт поискового вектора рецептов после их сохранения.
+
+    Без PostgreSQL id рецептов пишутся в журнал под очередным номером
+    версии модели Recipe, процессы обновляют по нему свои индексы.
+    """
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            search_vector=search_vector())
+    else:
+        recipe_ids = list(recipe_ids)
+        cache.set(_log_key(bump_version(Recipe)), recipe_ids,
+                  timeout=LOG_TIMEOUT)
+
+
+class RecipeSearchIndex:
+    """Обратный индекс рецептов в памяти процесса для баз без tsvector.
+
+    Считает те же основы слов и веса полей, что и PostgreSQL. Изменённые
+    рецепты перечитываются из БД по журналу в общем кэше, индекс строится
+    заново, только если процесс отстал от журнала или изменился
+    справочник ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._sequence = None
+        self._documents = {}
+        self._postings = {}
+
+    def _ensure_fresh(self):
+        catalog, sequence = get_versions([(Ingredient, None), (Recipe, None)])
+        if catalog == self._catalog and sequence == self._sequence:
+            return
+        with self._lock:
+            if catalog == self._catalog and sequence == self._sequence:
+                return
+            changed = None
+            if catalog == self._catalog:
+                changed = self._logged_changes(sequence)
+            if changed is None:
+                self._build()
+            else:
+                self._apply(changed)
+            self._catalog, self._sequence = catalog, sequence
+
+    def _logged_changes(self, sequence):
+        if not 0 < sequence - self._sequence <= MAX_LOG_GAP:
+            return None
+        keys = [_log_key(number)
+                for number in range(self._sequence + 1, sequence + 1)]
+        found = cache.get_many(keys)
+        if len(found) < len(keys):
+            return None
+        return set(chain.from_iterable(found.values()))
+
+    @staticmethod
+    def _load(recipe_ids=None):
+        """Веса основ слов рецептов, у удалённых рецептов их нет."""
+        recipes = Recipe.objects.all()
+        ingredients = RecipeIngredient.objects.all()
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+            ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+        documents = defaultdict(lambda: defaultdict(float))
+        fields = [('A', recipes.values_list('id', 'name')),
+                  ('B', ingredients.values_list(
+                      'recipe_id', 'ingredient__name')),
+                  ('C', recipes.values_list('id', 'text'))]
+        for weight, rows in fields:
+            for recipe_id, text in rows.iterator():
+                for term in terms(text):
+                    documents[recipe_id][term] += WEIGHTS[weight]
+        return {pk: dict(weights) for pk, weights in documents.items()}
+
+    def _build(self):
+        documents = self._load()
+        postings = defaultdict(dict)
+        for pk, weights in documents.items():
+            for term, weight in weights.items():
+                postings[term][pk] = weight
+        self._documents, self._postings = documents, dict(postings)
+
+    def _apply(self, recipe_ids):
+        """Замена записей рецептов без изменения читаемых сейчас словарей."""
+        loaded = self._load(recipe_ids)
+        documents, postings = dict(self._documents), dict(self._postings)
+        copied = set()
+        for pk in recipe_ids:
+            old, new = documents.pop(pk, {}), loaded.get(pk, {})
+            for term in old.keys() | new.keys():
+                if term not in copied:
+                    postings[term] = dict(postings.get(term, {}))
+                    copied.add(term)
+                if term in new:
+                    postings[term][pk] = new[term]
+                else:
+                    postings[term].pop(pk, None)
+            if new:
+                documents[pk] = new
+        for term in copied:
+            if not postings[term]:
+                del postings[term]
+        self._documents, self._postings = documents, postings
+
+    def search(self, query, limit=None):
+        """id рецептов со всеми словами запроса, по убыванию веса.
+
+        При заданном limit возвращаются только limit лучших.
+        """
+        self._ensure_fresh()
+        postings = self._postings
+        query_terms = set(terms(query))
+        if not query_terms:
+            return []
+        matches = [postings.get(term, {}) for term in query_terms]
+        matches.sort(key=len)
+        scores = {
+            recipe_id: sum(match[recipe_id] for match in matches)
+            for recipe_id in matches[0]
+            if all(recipe_id in match for match in matches[1:])
+        }
+        if limit is None:
+            return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+        return heapq.nsmallest(
+            limit, scores, key=lambda pk: (-scores[pk], -pk))
+
+
+recipe_search_index = RecipeSearchIndex()
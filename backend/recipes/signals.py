@@ -0,0 +1,174 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from users.models import Follow, User
+
+from .counters import change_counter
+from .feed import fan_out, follow_added, follow_removed
+from .images import (delete_variants, schedule_variants, variant_names,
+                     variants_outdated)
+from .models import (Favourites, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingList, Tag)
+from .relations import relations_changed
+from .search import update_search_vectors
+from .similarity import composition_changed
+from .totals import change_totals, recipe_amounts
+from .versioning import bump_version
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def catalog_changed(sender, **kwargs):
+    """Сброс индекса автодополнения и кэша ответов справочников."""
+    bump_version(sender)
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_added(sender, instance, created, **kwargs):
+    """Добавление ингредиентов рецепта в итоги списка покупок."""
+    if created:
+        change_totals([instance.user_id], recipe_amounts(instance.recipe_id))
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_removed(sender, instance, **kwargs):
+    """Вычитание ингредиентов рецепта из итогов списка покупок.
+
+    Срабатывает до удаления, поэтому ингредиенты рецепта ещё доступны
+    и при каскадном удалении самого рецепта.
+    """
+    change_totals([instance.user_id], {
+        pk: -amount
+        for pk, amount in recipe_amounts(instance.recipe_id).items()
+    })
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    """Создание уменьшенных копий нового фото рецепта."""
+    if variants_outdated(instance):
+        schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    """Удаление копий фото удалённого рецепта после фиксации."""
+    names = variant_names(instance)
+    transaction.on_commit(lambda: delete_variants(names))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    """Учёт рецепта у автора и раскладка по лентам подписчиков."""
+    if created:
+        change_counter(User, 'recipes_count', instance.author_id, 1)
+        fan_out(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, 'recipes_count', instance.author_id, -1)
+
+
+@receiver(post_save, sender=Favourites)
+def favourite_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, 'favourites_count', instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=Favourites)
+def favourite_removed(sender, instance, **kwargs):
+    change_counter(Recipe, 'favourites_count', instance.recipe_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, 'followers_count', instance.author_id, 1)
+        follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_counter(User, 'followers_count', instance.author_id, -1)
+    follow_removed(instance)
+
+
+@receiver(post_save, sender=Favourites)
+@receiver(post_delete, sender=Favourites)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def user_relation_changed(sender, instance, **kwargs):
+    """Сброс закэшированных id избранного, покупок и подписок."""
+    relations_changed(sender, instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_text_changed(sender, instance, **kwargs):
+    """Пересчёт поискового вектора после записи рецепта и ингредиентов."""
+    recipe_ids = [instance.id]
+    transaction.on_commit(lambda: update_search_vectors(recipe_ids))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    recipe_ids = [instance.recipe_id]
+    transaction.on_commit(lambda: update_search_vectors(recipe_ids))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        recipe_ids = instance.recipes.values_list('recipe_id', flat=True)
+        transaction.on_commit(lambda: update_search_vectors(recipe_ids))
+
+
+def recipes_changed(recipe_ids):
+    """Сброс закэшированных представлений рецептов после фиксации."""
+    transaction.on_commit(
+        lambda: [bump_version(Recipe, pk) for pk in recipe_ids])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    recipes_changed([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_composition_changed(sender, instance, **kwargs):
+    """Рецепт перечитывается в индекс похожих после фиксации.
+
+    Ингредиенты сериализатор и админка пишут в той же транзакции, что и
+    сам рецепт, поэтому отдельных сигналов по строкам не нужно.
+    """
+    composition_changed([instance.id])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    recipes_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipes_changed([instance.id])
+        composition_changed([instance.id])
+    elif pk_set:
+        recipes_changed(list(pk_set))
+        composition_changed(list(pk_set))
+    else:
+        # Очистка тегов со стороны тега не передаёт id рецептов
+        bump_version(Tag)
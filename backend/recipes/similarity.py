@@ -0,0 +1,273 @@
+import threading
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+from .versioning import bump_version, get_versions
+
+# Изменённые рецепты копятся поверх матрицы, пока их не станет больше
+# COMPACT_AFTER, затем матрица строится заново. Журнал изменений в кэше
+# читается, если процесс отстал не больше чем на MAX_LOG_GAP записей
+COMPACT_AFTER = 1000
+MAX_LOG_GAP = 1000
+LOG_TIMEOUT = 24 * 60 * 60
+
+Matrix = namedtuple('Matrix', (
+    'recipe_ids', 'features', 'weights', 'norms',
+    'row_ptr', 'row_columns', 'column_ptr', 'column_rows'))
+
+
+def ingredient_feature(ingredient_id):
+    return 2 * ingredient_id
+
+
+def tag_feature(tag_id):
+    return 2 * tag_id + 1
+
+
+def _feature_weights(features, df, recipes_count):
+    """Сглаженный IDF признака, теги весят SIMILAR_RECIPES_TAG_WEIGHT."""
+    idf = np.log((1 + recipes_count) / (1 + df)) + 1
+    return idf * np.where(
+        features % 2, settings.SIMILAR_RECIPES_TAG_WEIGHT, 1.0)
+
+
+def build_matrix(recipe_ids, pairs):
+    """Разреженная матрица рецепт × признак по парам (id рецепта, признак).
+
+    Хранится построчно для признаков рецепта и по столбцам для рецептов
+    с признаком. Пары с рецептами не из recipe_ids отбрасываются.
+    """
+    recipe_ids = np.unique(np.asarray(recipe_ids, dtype=np.int64))
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    count = len(recipe_ids)
+    rows = np.searchsorted(recipe_ids, pairs[:, 0])
+    known = rows < count
+    known[known] = recipe_ids[rows[known]] == pairs[known, 0]
+    rows, keys = rows[known], pairs[known, 1]
+    features, columns = np.unique(keys, return_inverse=True)
+    cells = np.unique(rows * max(len(features), 1) + columns)
+    rows, columns = np.divmod(cells, max(len(features), 1))
+    df = np.bincount(columns, minlength=len(features))
+    weights = _feature_weights(features, df, count)
+    return Matrix(
+        recipe_ids=recipe_ids,
+        features=features,
+        weights=weights,
+        norms=np.sqrt(np.bincount(
+            rows, weights=weights[columns] ** 2, minlength=count)),
+        row_ptr=np.concatenate(([0], np.cumsum(
+            np.bincount(rows, minlength=count)))),
+        row_columns=columns,
+        column_ptr=np.concatenate(([0], np.cumsum(df))),
+        column_rows=rows[np.argsort(columns, kind='stable')],
+    )
+
+
+def _ranges(ptr, indices):
+    """Позиции элементов строк или столбцов indices одним массивом."""
+    starts, ends = ptr[indices], ptr[indices + 1]
+    lengths = ends - starts
+    offsets = np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+    return np.arange(lengths.sum()) - offsets, lengths
+
+
+class RecipeSimilarityIndex:
+    """Похожие рецепты по общим ингредиентам и тегам в памяти процесса.
+
+    Сходство косинусное по признакам с весами IDF, поэтому общая соль
+    почти ничего не значит, а редкий ингредиент сближает рецепты. Ответ
+    считается по столбцам матрицы только для признаков исходного рецепта,
+    без обхода таблицы ингредиентов. Изменённые рецепты читаются из БД
+    по журналу в общем кэше и хранятся поверх матрицы до её перестройки.
+    Изменение тегов или ингредиентов справочника перестраивает матрицу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._sequence = None
+        self._state = self._empty(build_matrix((), ()))
+
+    def _ensure_fresh(self):
+        *catalog, sequence = get_versions(
+            [(Tag, None), (Ingredient, None), (RecipeIngredient, None)])
+        if catalog == self._catalog and sequence == self._sequence:
+            return
+        with self._lock:
+            if catalog == self._catalog and sequence == self._sequence:
+                return
+            changed = None
+            if catalog == self._catalog:
+                changed = self._logged_changes(sequence)
+            if changed is None:
+                self._state = self._build()
+            else:
+                self._apply(changed)
+            self._catalog, self._sequence = catalog, sequence
+
+    def _logged_changes(self, sequence):
+        if not 0 < sequence - self._sequence <= MAX_LOG_GAP:
+            return None
+        keys = [_log_key(number)
+                for number in range(self._sequence + 1, sequence + 1)]
+        found = cache.get_many(keys)
+        if len(found) < len(keys):
+            return None
+        return set(chain.from_iterable(found.values()))
+
+    @staticmethod
+    def _build():
+        pairs = chain(
+            ((recipe_id, ingredient_feature(ingredient_id))
+             for recipe_id, ingredient_id in RecipeIngredient.objects
+             .values_list('recipe_id', 'ingredient_id').iterator()),
+            ((recipe_id, tag_feature(tag_id))
+             for recipe_id, tag_id in Recipe.tags.through.objects
+             .values_list('recipe_id', 'tag_id').iterator()),
+        )
+        matrix = build_matrix(
+            np.fromiter(Recipe.objects.values_list('id', flat=True)
+                        .iterator(), dtype=np.int64),
+            np.fromiter(chain.from_iterable(pairs), dtype=np.int64))
+        return RecipeSimilarityIndex._empty(matrix)
+
+    @staticmethod
+    def _empty(matrix):
+        return matrix, {}, np.empty(0, np.int64)
+
+    def _apply(self, recipe_ids):
+        matrix, overlay, _ = self._state
+        overlay = {**overlay, **{
+            pk: self._entry(matrix, features)
+            for pk, features in self._load(recipe_ids).items()}}
+        if len(overlay) > COMPACT_AFTER:
+            self._state = self._build()
+            return
+        rows = [self._row(matrix, pk) for pk in overlay]
+        self._state = matrix, overlay, np.array(
+            [row for row in rows if row is not None], dtype=np.int64)
+
+    @classmethod
+    def _entry(cls, matrix, features):
+        """Признаки рецепта поверх матрицы и длина его вектора."""
+        weights = cls._weights(matrix, features)
+        return features, sum(weight ** 2 for weight in weights.values()) ** .5
+
+    @staticmethod
+    def _load(recipe_ids):
+        """Признаки рецептов из БД, у удалённых рецептов их нет."""
+        features = {pk: set() for pk in recipe_ids}
+        existing = set(Recipe.objects.filter(id__in=recipe_ids)
+                       .values_list('id', flat=True))
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=existing).values_list(
+                    'recipe_id', 'ingredient_id'):
+            features[recipe_id].add(ingredient_feature(ingredient_id))
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+                recipe_id__in=existing).values_list('recipe_id', 'tag_id'):
+            features[recipe_id].add(tag_feature(tag_id))
+        return {pk: frozenset(keys) for pk, keys in features.items()}
+
+    def similar(self, recipe_id, limit):
+        """id самых похожих рецептов, от более похожих к менее."""
+        self._ensure_fresh()
+        matrix, overlay, stale_rows = self._state
+        row = self._row(matrix, recipe_id)
+        if recipe_id in overlay:
+            features, norm = overlay[recipe_id]
+        elif row is not None:
+            features = self._row_features(matrix, row)
+            norm = matrix.norms[row]
+        else:
+            features = frozenset()
+        if not features or limit <= 0:
+            return []
+        weights = self._weights(matrix, features)
+        scores = self._matrix_scores(matrix, features)
+        scores[stale_rows] = 0
+        if row is not None:
+            scores[row] = 0
+        top = np.arange(len(scores))
+        if len(scores) > limit:
+            top = np.argpartition(scores, -limit)[-limit:]
+        candidates = {
+            int(matrix.recipe_ids[row]): scores[row] / norm
+            for row in top if scores[row] > 0}
+        for pk, (other, other_norm) in overlay.items():
+            common = features & other
+            if common and pk != recipe_id:
+                candidates[pk] = sum(
+                    weights[key] ** 2 for key in common) / (
+                        norm * other_norm)
+        return sorted(candidates, key=lambda pk: (-candidates[pk], -pk))[
+            :limit]
+
+    @staticmethod
+    def _row(matrix, recipe_id):
+        row = int(np.searchsorted(matrix.recipe_ids, recipe_id))
+        if (row == len(matrix.recipe_ids)
+                or matrix.recipe_ids[row] != recipe_id):
+            return None
+        return row
+
+    @staticmethod
+    def _row_features(matrix, row):
+        columns = matrix.row_columns[
+            matrix.row_ptr[row]:matrix.row_ptr[row + 1]]
+        return frozenset(matrix.features[columns].tolist())
+
+    @staticmethod
+    def _weights(matrix, features):
+        """Веса признаков; новых признаков ещё нет в матрице, df = 1."""
+        keys = np.fromiter(features, dtype=np.int64, count=len(features))
+        columns = np.searchsorted(matrix.features, keys)
+        known = columns < len(matrix.features)
+        known[known] = matrix.features[columns[known]] == keys[known]
+        weights = _feature_weights(
+            keys, np.ones(len(keys)), len(matrix.recipe_ids))
+        weights[known] = matrix.weights[columns[known]]
+        return dict(zip(keys.tolist(), weights.tolist()))
+
+    @staticmethod
+    def _matrix_scores(matrix, features):
+        """Сходство со всеми строками матрицы через столбцы признаков."""
+        keys = np.fromiter(features, dtype=np.int64, count=len(features))
+        columns = np.searchsorted(matrix.features, keys)
+        known = columns < len(matrix.features)
+        known[known] = matrix.features[columns[known]] == keys[known]
+        columns = columns[known]
+        positions, lengths = _ranges(matrix.column_ptr, columns)
+        products = np.bincount(
+            matrix.column_rows[positions],
+            weights=np.repeat(matrix.weights[columns] ** 2, lengths),
+            minlength=len(matrix.recipe_ids))
+        return np.divide(products, matrix.norms,
+                         out=np.zeros_like(products),
+                         where=matrix.norms > 0)
+
+
+def _log_key(number):
+    return f'similarity:changes:{number}'
+
+
+def composition_changed(recipe_ids):
+    """Запись в журнал рецептов, у которых изменились ингредиенты или теги.
+
+    Номер записи — версия модели RecipeIngredient, процессы перечитывают
+    из БД только рецепты из пропущенных записей.
+    """
+    recipe_ids = list(recipe_ids)
+
+    def log():
+        cache.set(_log_key(bump_version(RecipeIngredient)), recipe_ids,
+                  timeout=LOG_TIMEOUT)
+    transaction.on_commit(log)
+
+
+recipe_similarity_index = RecipeSimilarityIndex()
@@ -0,0 +1,99 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import RecipeIngredient, ShoppingList, ShoppingListTotal
+
+
+def recipe_amounts(recipe_id):
+    """Количество каждого ингредиента в рецепте."""
+    return recipes_amounts([recipe_id])
+
+
+def recipes_amounts(recipe_ids):
+    """Суммарное количество каждого ингредиента в нескольких рецептах."""
+    return Counter(dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values_list('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    ))
+
+
+def change_totals(user_ids, deltas):
+    """Прибавление изменений количества к итогам списков покупок.
+
+    Итог меньше нуля нарушает ограничение поля amount: значит, итоги
+    разошлись со списками и их нужно пересобрать rebuild_shopping_totals.
+    """
+    user_ids = list(user_ids)
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    rows = ShoppingListTotal.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas)
+    with transaction.atomic():
+        existing = set(rows.select_for_update().values_list(
+            'user_id', 'ingredient_id'))
+        rows.update(amount=F('amount') + Case(
+            *(When(ingredient_id=pk, then=Value(delta))
+              for pk, delta in deltas.items()),
+            output_field=IntegerField(),
+        ))
+        ShoppingListTotal.objects.bulk_create(
+            ShoppingListTotal(user_id=user_id, ingredient_id=pk,
+                              amount=delta)
+            for user_id in user_ids
+            for pk, delta in deltas.items()
+            if (user_id, pk) not in existing
+        )
+        rows.filter(amount=0).delete()
+
+
+def change_recipe_in_totals(recipe_id, old_amounts, new_amounts):
+    """Пересчёт итогов у всех, у кого рецепт в списке покупок."""
+    deltas = Counter(new_amounts)
+    deltas.subtract(old_amounts)
+    if not any(deltas.values()):
+        return
+    copies = Counter(ShoppingList.objects.filter(recipe_id=recipe_id)
+                     .values_list('user_id', flat=True))
+    users_by_copies = defaultdict(list)
+    for user_id, count in copies.items():
+        users_by_copies[count].append(user_id)
+    for count, user_ids in users_by_copies.items():
+        change_totals(user_ids, {pk: delta * count
+                                 for pk, delta in deltas.items()})
+
+
+def live_totals():
+    """Итоги, посчитанные агрегацией по спискам покупок."""
+    return {
+        (row['recipe__shopping_list__user'], row['ingredient']): row['amount']
+        for row in RecipeIngredient.objects
+        .filter(recipe__shopping_list__isnull=False)
+        .values('recipe__shopping_list__user', 'ingredient')
+        .annotate(amount=Sum('amount'))
+        .order_by()
+    }
+
+
+def stored_totals():
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in ShoppingListTotal.objects
+        .values_list('user_id', 'ingredient_id', 'amount')
+    }
+
+
+@transaction.atomic
+def rebuild_totals():
+    """Пересоздание таблицы итогов по текущим спискам покупок."""
+    ShoppingListTotal.objects.all().delete()
+    ShoppingListTotal.objects.bulk_create(
+        (ShoppingListTotal(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=amount)
+         for (user_id, ingredient_id), amount in live_totals().items()),
+        batch_size=1000,
+    )
@@ -0,0 +1,52 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(model, pk=None):
+    key = f'version:{model._meta.label_lower}'
+    if pk is not None:
+        key = f'{key}:{pk}'
+    return key
+
+
+def _initial_version():
+    # Версия, вытесненная из кэша, не должна начаться заново с уже
+    # выданного значения, иначе устаревшие данные снова станут актуальными
+    return time.time_ns() // 1000
+
+
+def get_version(model, pk=None):
+    """Текущая версия данных модели или отдельного объекта."""
+    key = _version_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        version = _initial_version()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(model, pk=None):
+    """Увеличение версии после изменения данных модели или объекта."""
+    key = _version_key(model, pk)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_with_versions(keys, objects):
+    """Значения ключей кэша и версии пар (модель, pk) одним обращением."""
+    version_keys = [_version_key(model, pk) for model, pk in objects]
+    found = cache.get_many([*keys, *version_keys])
+    versions = [found[key] if key in found else get_version(model, pk)
+                for key, (model, pk) in zip(version_keys, objects)]
+    return {key: found[key] for key in keys if key in found}, versions
+
+
+def get_versions(objects):
+    """Версии нескольких пар (модель, pk) одним обращением к кэшу."""
+    return get_with_versions((), objects)[1]
@@ -14,22 +14,29 @@ class UserAdmin(admin.ModelAdmin):
         'get_count_followers',
         'get_recipes_count'
     )
-    search_fields = ('username',)
-    list_filter = ('username', 'email')
+    search_fields = ('^username', '^email')
+    list_filter = ('is_staff', 'is_active')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     ordering = ['username']
 
-    @admin.display(description='Количество подписчиков')
+    @admin.display(description='Количество подписчиков',
+                   ordering='followers_count')
     def get_count_followers(self, obj):
-        return obj.follower.count()
+        return obj.followers_count
 
-    @admin.display(description='Количество рецептов')
+    @admin.display(description='Количество рецептов',
+                   ordering='recipes_count')
     def get_recipes_count(self, obj):
-        return obj.recipe.count()
+        return obj.recipes_count
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
+    search_fields = ('^user__username', '^author__username')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     ordering = ['user']
 
@@ -16,6 +16,15 @@ class User(AbstractUser):
                               blank=False,
                               unique=True
                               )
+    followers_count = models.PositiveIntegerField('Число подписчиков',
+                                                  default=0,
+                                                  editable=False)
+    recipes_count = models.PositiveIntegerField('Число рецептов',
+                                                default=0,
+                                                editable=False)
+    feed_pulled = models.BooleanField('Рецепты в ленты при чтении',
+                                      default=False,
+                                      editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -47,6 +56,16 @@ class Follow(models.Model):
         ordering = ('author',)
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_follow'
+            ),
+        )
 
     def __str__(self):
         return f'Пользователь {self.user} подписан на {self.author}'